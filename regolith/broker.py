@@ -1,5 +1,5 @@
 """API for accessing the metadata and file storage"""
-from regolith.database import dump_database, open_dbs
+from regolith.database import dump_databases, open_dbs
 from regolith.runcontrol import DEFAULT_RC, load_rcfile, filter_databases
 from regolith.storage import store_client, push
 
@@ -54,10 +54,23 @@ class Broker:
         if "files" not in document:
             document["files"] = {}
         document["files"][name] = output_path
-        for db in self.rc.databases:
-            dump_database(db, self.db_client, self.rc)
+        self._mark_document_dirty(document)
+        dump_databases(self.rc.databases, self.db_client, self.rc)
         push(self.store.store, self.store.path)
 
+    def _mark_document_dirty(self, document):
+        """Tells the database client which collections hold a document that
+        was changed in place, so that they are dumped."""
+        mark_dirty = getattr(self.db_client, "mark_dirty", None)
+        if mark_dirty is None:
+            return
+        for collname in self.md:
+            if self.md[collname].get(document.get("_id")) is not document:
+                continue
+            for dbname, colls in self._dbs.items():
+                if document["_id"] in colls.get(collname, {}):
+                    mark_dirty(dbname, collname)
+
     @classmethod
     def from_rc(cls, rc_file="regolithrc.json"):
         """Return a Broker instance"""
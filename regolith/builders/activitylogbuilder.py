@@ -76,7 +76,7 @@ class ActivitylogBuilder(LatexBuilderBase):
         if not rc.from_date:
             raise RuntimeError("ERROR: please rerun specifying --from")
         build_target = get_id_from_name(
-            all_docs_from_collection(rc.client, "people"), rc.people[0])
+            rc.client.identity_index("people"), rc.people[0])
         begin_year = int(rc.from_date.split("-")[0])
         begin_month = int(rc.from_date.split("-")[1])
         pre_begin_year = begin_year - 1
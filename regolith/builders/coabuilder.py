@@ -18,7 +18,7 @@ from regolith.builders.basebuilder import BuilderBase
 from regolith.dates import has_started
 from regolith.sorters import position_key
 from regolith.tools import all_docs_from_collection, filter_publications, \
-    fuzzy_retrieval
+    identity_retrieval
 
 NUM_COAUTHOR_MONTHS = 48
 NUM_POSTDOC_MONTHS = 60
@@ -39,18 +39,11 @@ def get_advisors_name_inst(advisee, rc):
     ]
     advisors = phd_advisors + pdoc_advisors
     for advisor in advisors:
-        adv = fuzzy_retrieval(
-            all_docs_from_collection(rc.client, "contacts"),
-            ['aka', 'name', '_id'], advisor[0],
-            case_sensitive=False
-        )
+        adv = identity_retrieval(rc.client, "contacts", advisor[0])
         if adv:
             advsior_name = HumanName(adv.get("name"))
-            inst = fuzzy_retrieval(
-                all_docs_from_collection(rc.client, "institutions"),
-                ['aka', 'name', '_id'], adv.get("institution"),
-                case_sensitive=False
-            )
+            inst = identity_retrieval(rc.client, "institutions",
+                                      adv.get("institution"))
             if inst:
                 yield advsior_name.last, advsior_name.first, inst.get("name", "")
             else:
@@ -69,10 +62,7 @@ def get_advisees_name_inst(coll, advisor, rc):
 #                if edu['status'] == 'postdoc'
                 person_name = HumanName(person.get("name"))
                 inst_name = edu.get("institution")
-                inst = fuzzy_retrieval(
-                    all_docs_from_collection(rc.client, "institutions"),
-                    ['aka', 'name', '_id'], inst_name,
-                    case_sensitive=False)
+                inst = identity_retrieval(rc.client, "institutions", inst_name)
                 first_name = " ".join([person_name.first,  person_name.middle])
                 if inst is None:
                     print("WARNING: {} not in institutions".format(
@@ -145,24 +135,16 @@ def query_people_and_institutions(rc, names):
     """Get the people and institutions names."""
     people, institutions = [], []
     for person_name in names:
-        person_found = fuzzy_retrieval(all_docs_from_collection(
-            rc.client, "people"),
-            ["name", "aka", "_id"],
-            person_name, case_sensitive=False)
+        person_found = identity_retrieval(rc.client, "people", person_name)
         if not person_found:
-            person_found = fuzzy_retrieval(all_docs_from_collection(
-                rc.client, "contacts"),
-                ["name", "aka", "_id"], person_name, case_sensitive=False)
+            person_found = identity_retrieval(rc.client, "contacts", person_name)
             if not person_found:
                 print(
                     "WARNING: {} not found in contacts or people. Check aka".format(
                         person_name))
             else:
                 people.append(person_found['name'])
-                inst = fuzzy_retrieval(all_docs_from_collection(
-                    rc.client, "institutions"),
-                    ["name", "aka", "_id"],
-                    person_found["institution"], case_sensitive=False)
+                inst = identity_retrieval(rc.client, "institutions", person_found["institution"])
                 if inst:
                     institutions.append(inst["name"])
                 else:
@@ -172,9 +154,7 @@ def query_people_and_institutions(rc, names):
         else:
             people.append(person_found['name'])
             pinst = get_recent_org(person_found)
-            inst = fuzzy_retrieval(all_docs_from_collection(
-                rc.client, "institutions"), ["name", "aka", "_id"],
-                pinst, case_sensitive=False)
+            inst = identity_retrieval(rc.client, "institutions", pinst)
             if inst:
                 institutions.append(inst["name"])
             else:
@@ -194,9 +174,7 @@ def get_inst_name(person, rc):
         person_inst_abbr = person.get('institution')
     else:
         person_inst_abbr = ''
-    person_inst = fuzzy_retrieval(all_docs_from_collection(
-        rc.client, "institutions"), ["name", "aka", "_id"],
-        person_inst_abbr, case_sensitive=False)
+    person_inst = identity_retrieval(rc.client, "institutions", person_inst_abbr)
     if person_inst is not None:
         person_inst_name = person_inst.get("name")
     else:
@@ -230,10 +208,7 @@ def format_last_first_instutition_names(rc, ppl_names, excluded_inst_name=None):
     """Get the last name, first name and institution name."""
     ppl = []
     for ppl_tup in ppl_names:
-        inst = fuzzy_retrieval(
-            all_docs_from_collection(rc.client, "institutions"),
-            ['aka', 'name', '_id'], ppl_tup[1],
-            case_sensitive=False)
+        inst = identity_retrieval(rc.client, "institutions", ppl_tup[1])
         if inst:
             inst_name = inst.get("name", "")
         else:
@@ -306,20 +281,10 @@ def unmerge(ws, cells):
 
 def get_person(person_id, rc):
     """Get the person's name."""
-    person_found = fuzzy_retrieval(
-        all_docs_from_collection(rc.client, "people"),
-        ["name", "aka", "_id"],
-        person_id,
-        case_sensitive=False
-    )
+    person_found = identity_retrieval(rc.client, "people", person_id)
     if person_found:
         return person_found
-    person_found = fuzzy_retrieval(
-        all_docs_from_collection(rc.client, "contacts"),
-        ["name", "aka", "_id"],
-        person_id,
-        case_sensitive=False
-    )
+    person_found = identity_retrieval(rc.client, "contacts", person_id)
     if person_found:
         return person_found
     print("WARNING: {} missing from people and contacts. Check aka.".format(person_id))
@@ -389,9 +354,7 @@ class RecentCollaboratorsBuilder(BuilderBase):
         """Query the data base for the target's collaborators' information."""
         rc = self.rc
         gtx = self.gtx
-        person = fuzzy_retrieval(all_docs_from_collection(rc.client, "people"),
-                                 ['aka', 'name', '_id'], target,
-                                 case_sensitive=False)
+        person = identity_retrieval(rc.client, "people", target)
         if not person:
             raise RuntimeError("Person {} not found in people.".format(target))
         pubs = get_person_pubs(gtx["citations"], person)
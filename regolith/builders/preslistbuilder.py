@@ -26,7 +26,7 @@ from regolith.fsclient import _id_key
 from regolith.sorters import position_key
 from regolith.tools import (
     all_docs_from_collection,
-    fuzzy_retrieval,
+    IdentityIndex,
     number_suffix,
     group_member_ids
 )
@@ -78,6 +78,9 @@ class PresListBuilder(LatexBuilderBase):
         print(self.rc.people)
         print(self.rc.grants)
 
+        people_index = IdentityIndex(self.gtx["people"], case_sensitive=False)
+        institutions_index = IdentityIndex(self.gtx["institutions"],
+                                           case_sensitive=False)
         for group in self.gtx["groups"]:
             grp = group["_id"]
             grpmember_ids = group_member_ids(self.gtx['people'], grp)
@@ -99,12 +102,7 @@ class PresListBuilder(LatexBuilderBase):
                     if isinstance(pauthors, str):
                         pauthors = [pauthors]
                     authors = [
-                        fuzzy_retrieval(
-                            self.gtx["people"],
-                            ["aka", "name", "_id"],
-                            author,
-                            case_sensitive=False,
-                        )
+                        people_index.get(author)
                         for author in pauthors
                     ]
                     authorids = [
@@ -130,19 +128,8 @@ class PresListBuilder(LatexBuilderBase):
                         pauthors = [pauthors]
                     pres["authors"] = [
                         author
-                        if fuzzy_retrieval(
-                            self.gtx["people"],
-                            ["aka", "name", "_id"],
-                            author,
-                            case_sensitive=False,
-                        )
-                        is None
-                        else fuzzy_retrieval(
-                            self.gtx["people"],
-                            ["aka", "name", "_id"],
-                            author,
-                            case_sensitive=False,
-                        )["name"]
+                        if people_index.get(author) is None
+                        else people_index.get(author)["name"]
                         for author in pauthors
                     ]
                     authorlist = ", ".join(pres["authors"])
@@ -170,11 +157,8 @@ class PresListBuilder(LatexBuilderBase):
                     if "institution" in pres:
                         inst = pres["institution"]
                         try:
-                            pres["institution"] = fuzzy_retrieval(
-                                self.gtx["institutions"],
-                                ["aka", "name", "_id"],
-                                pres["institution"],
-                                case_sensitive=False,
+                            pres["institution"] = institutions_index.get(
+                                pres["institution"]
                             )
                             if pres["institution"] is None:
                                 print(
@@ -8,6 +8,7 @@ import itertools
 
 from collections import ChainMap
 from collections.abc import MutableMapping
+from copy import deepcopy
 
 
 class ChainDBSingleton(object):
@@ -26,9 +27,22 @@ Singleton = ChainDBSingleton()
 
 class ChainDB(ChainMap):
     """ A ChainMap who's ``_getitem__`` returns either a ChainDB or
-    the result"""
+    the result
+
+    If memoize is True, the child ChainDBs and concatenated lists are kept
+    once made, so that reading the same key again does not probe every
+    mapping. The kept values are shared between reads, and they are not
+    noticed when the underlying mappings change, so call ``invalidate``
+    after changing them other than through this ChainDB."""
+
+    def __init__(self, *maps, memoize=False):
+        super().__init__(*maps)
+        self.memoize = memoize
+        self._memo = {}
 
     def __getitem__(self, key):
+        if self.memoize and key in self._memo:
+            return self._memo[key]
         res = None
         results = []
         # Try to get all the data from all the mappings
@@ -38,19 +52,22 @@ class ChainDB(ChainMap):
         if all([isinstance(result, MutableMapping) for result in results]):
             for result in results:
                 if res is None:
-                    res = ChainDB(result)
+                    res = ChainDB(result, memoize=self.memoize)
                 else:
                     res.maps.append(result)
         elif all([isinstance(result, list) for result in results]):
-            return list(itertools.chain(*results))
+            res = list(itertools.chain(*results))
         else:
             for result in reversed(results):
                 if result is not Singleton:
                     return result
             raise KeyError("{} is none of the current mappings".format(key))
+        if self.memoize:
+            self._memo[key] = res
         return res
 
     def __setitem__(self, key, value):
+        self._memo.pop(key, None)
         if key not in self:
             super().__setitem__(key, value)
         else:
@@ -61,6 +78,137 @@ class ChainDB(ChainMap):
                 if key in mapping:
                     mapping[key] = value
 
+    def __delitem__(self, key):
+        self._memo.pop(key, None)
+        super().__delitem__(key)
+
+    def invalidate(self, key=None):
+        """Forgets the memoized value of a key, or of all keys if key is
+        None."""
+        if key is None:
+            self._memo.clear()
+        else:
+            self._memo.pop(key, None)
+
+
+def _merge_values(results):
+    """Merges the values of a key across maps by the rules of
+    ``ChainDB.__getitem__``."""
+    if all([isinstance(result, MutableMapping) for result in results]):
+        return merge_maps(*results)
+    elif all([isinstance(result, list) for result in results]):
+        return list(itertools.chain(*results))
+    for result in reversed(results):
+        if result is not Singleton:
+            return result
+    raise KeyError("none of the results are in the current mappings")
+
+
+def merge_maps(*maps):
+    """Flattens maps into a single dict, with the same precedence and list
+    concatenation that a ChainDB of the maps gives when it is read.
+
+    Parameters
+    ----------
+    maps : mappings
+        The maps, in the order they would be given to ChainDB.
+
+    Returns
+    -------
+    merged : dict
+    """
+    keys = {}
+    for mapping in reversed(maps):
+        keys.update(dict.fromkeys(mapping))
+    return {key: _merge_values([mapping.get(key, Singleton)
+                                for mapping in maps])
+            for key in keys}
+
+
+class MergedCollections(MutableMapping):
+    """Maps collection names to merged snapshots of the collection across
+    databases. Each snapshot maps document ids to plain dicts made by
+    ``merge_maps``, is built when it is first accessed and is kept until it
+    is invalidated.
+
+    Parameters
+    ----------
+    builders : dict, optional
+        Maps collection names to functions that return the snapshot.
+    """
+
+    def __init__(self, builders=None):
+        self._builders = dict(builders or {})
+        self._snapshots = {}
+
+    def __getitem__(self, key):
+        if key not in self._snapshots:
+            self._snapshots[key] = self._builders[key]()
+        return self._snapshots[key]
+
+    def __setitem__(self, key, value):
+        self._snapshots[key] = value
+
+    def __delitem__(self, key):
+        found = key in self._builders or key in self._snapshots
+        self._builders.pop(key, None)
+        self._snapshots.pop(key, None)
+        if not found:
+            raise KeyError(key)
+
+    def __iter__(self):
+        return iter(dict.fromkeys(
+            itertools.chain(self._builders, self._snapshots)))
+
+    def __len__(self):
+        return len(set(self._builders) | set(self._snapshots))
+
+    def __contains__(self, key):
+        return key in self._builders or key in self._snapshots
+
+    def add(self, key, build):
+        """Adds a collection whose snapshot is made by calling build."""
+        self._builders[key] = build
+        self._snapshots.pop(key, None)
+
+    def invalidate(self, key=None):
+        """Drops the snapshot of a collection, or of all collections if key
+        is None, so that it is rebuilt when next accessed."""
+        if key is None:
+            self._snapshots.clear()
+        elif key in self._builders:
+            self._snapshots.pop(key, None)
+
+    def is_built(self, key):
+        """Returns whether the snapshot of a collection has been built."""
+        return key in self._snapshots
+
+
+def invalidate(chained, collname):
+    """Drops the merged snapshot of a collection after a write, if the
+    chained database holds snapshots, or else forgets what the chained
+    documents of the collection have memoized. Collections and documents
+    that have not been loaded yet are left alone, and so are collections
+    whose documents do not memoize, which is found from the first loaded
+    document since they are all chained alike."""
+    if isinstance(chained, MergedCollections):
+        chained.invalidate(collname)
+        return
+    if collname not in chained or not _is_loaded(chained, collname):
+        return
+    coll = chained[collname]
+    for k in coll:
+        if _is_loaded(coll, k):
+            doc = coll[k]
+            if not isinstance(doc, ChainDB) or not doc.memoize:
+                return
+            doc.invalidate()
+
+
+def _is_loaded(mapping, key):
+    is_loaded = getattr(mapping, "is_loaded", None)
+    return is_loaded is None or is_loaded(key)
+
 
 def _convert_to_dict(cm):
     if isinstance(cm, (ChainMap, ChainDB)):
@@ -70,3 +218,127 @@ def _convert_to_dict(cm):
         return r
     else:
         return cm
+
+
+def _wrap(value):
+    if isinstance(value, (CopyOnWriteDict, CopyOnWriteList)):
+        return value
+    elif isinstance(value, dict):
+        return CopyOnWriteDict(value)
+    elif isinstance(value, list):
+        return CopyOnWriteList(value)
+    return value
+
+
+class CopyOnWriteDict(dict):
+    """A view of a dict that never modifies the dict it was made from.
+
+    Only the top level of the source is copied, and only as references.
+    Nested dicts and lists are wrapped in views of their own the first
+    time they are accessed, so a document that is only read is never deep
+    copied, and writing to part of a document only copies the levels on the
+    way to the write.
+    """
+
+    def __getitem__(self, key):
+        value = dict.__getitem__(self, key)
+        wrapped = _wrap(value)
+        if wrapped is not value:
+            dict.__setitem__(self, key, wrapped)
+        return wrapped
+
+    def __iter__(self):
+        # overriding __iter__ makes dict(), update() and ** go through
+        # __getitem__, so that they never see the unwrapped values.
+        return dict.__iter__(self)
+
+    def get(self, key, default=None):
+        if key in self:
+            return self[key]
+        return default
+
+    def setdefault(self, key, default=None):
+        if key not in self:
+            self[key] = default
+        return self[key]
+
+    def pop(self, key, *args):
+        if key in self:
+            value = self[key]
+            del self[key]
+            return value
+        return dict.pop(self, key, *args)
+
+    def popitem(self):
+        key, value = dict.popitem(self)
+        return key, _wrap(value)
+
+    def values(self):
+        return [self[key] for key in self]
+
+    def items(self):
+        return [(key, self[key]) for key in self]
+
+    def copy(self):
+        return CopyOnWriteDict(self.items())
+
+    def __deepcopy__(self, memo):
+        return {key: deepcopy(value, memo) for key, value in self.items()}
+
+    def __reduce__(self):
+        return dict, (), None, None, iter(self.items())
+
+
+class CopyOnWriteList(list):
+    """A view of a list that never modifies the list it was made from.
+
+    The elements are copied as references, and nested dicts and lists are
+    wrapped in views of their own the first time they are accessed.
+    """
+
+    def _wrapped(self, index):
+        value = list.__getitem__(self, index)
+        wrapped = _wrap(value)
+        if wrapped is not value:
+            list.__setitem__(self, index, wrapped)
+        return wrapped
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self._wrapped(i) for i in range(len(self))[index]]
+        return self._wrapped(index)
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self._wrapped(i)
+
+    def __reversed__(self):
+        for i in reversed(range(len(self))):
+            yield self._wrapped(i)
+
+    def pop(self, index=-1):
+        value = self._wrapped(index)
+        list.pop(self, index)
+        return value
+
+    def copy(self):
+        return list(self)
+
+    def __add__(self, other):
+        return list(self) + list(other)
+
+    def __deepcopy__(self, memo):
+        return [deepcopy(value, memo) for value in self]
+
+    def __reduce__(self):
+        return list, (), None, iter(self)
+
+
+def copy_on_write(doc):
+    """Returns a copy-on-write view of a document. The maps of a ChainDB
+    are each wrapped, so that the view merges the same way the document
+    does.
+    """
+    if isinstance(doc, ChainDB):
+        return ChainDB(*[_wrap(m) for m in doc.maps], memoize=doc.memoize)
+    return _wrap(doc)
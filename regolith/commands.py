@@ -9,6 +9,7 @@ from regolith.builder import builder, BUILDERS
 from regolith.deploy import deploy as dploy
 from regolith.emailer import emailer
 from regolith.helper import HELPERS, helpr
+from regolith.helpers.basehelper import DbHelperBase
 from regolith.runcontrol import RunControl
 from regolith.tools import string_types
 
@@ -137,6 +138,20 @@ def helper_db_check(rc):
     return dbs
 
 
+UPDATING_COMMANDS = frozenset(["add", "ingest", "app", "grade", "classlist"])
+"""The connected commands that write to the databases."""
+
+
+def fast_load_check(rc):
+    """Turns off fast_load for the commands and helpers that update the
+    databases. The collections they load are the ones they may dump, so they
+    are parsed with the round-trip loader to keep their formatting."""
+    if rc.cmd in UPDATING_COMMANDS or (
+            rc.cmd == "helper"
+            and issubclass(HELPERS[rc.helper_target][0], DbHelperBase)):
+        rc.fast_load = False
+
+
 def build(rc):
     """Builds all of the build targets"""
     for t in rc.build_targets:
@@ -202,6 +217,24 @@ def fs_to_mongo(rc: RunControl) -> None:
     return
 
 
+def fs_to_sqlite(rc: RunControl) -> None:
+    """Convert database collection from filesystem to an SQLite database.
+
+    Parameters
+    ----------
+    rc : RunControl
+        The RunControl. The SQLite database file is given by 'sqlitepath' in it. The databases will be
+        loaded according to the 'databases' in it.
+    """
+    from regolith.sqliteclient import SQLiteClient
+    client = SQLiteClient(rc)
+    dbs = getattr(rc, 'databases')
+    for db in dbs:
+        client.import_database(db)
+    client.close()
+    return
+
+
 def validate(rc):
     """Validate the combined database against the schemas"""
     from regolith.schemas import validate
@@ -1,23 +1,97 @@
 """Contains a client database backed by the file system."""
+import hashlib
 import json
+import mmap
 import os
+import pickle
 import sys
 from collections import defaultdict
+from collections.abc import Hashable, MutableMapping
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from copy import deepcopy
+from functools import partial
 from glob import iglob
 
 import ruamel.yaml
 from ruamel.yaml import YAML
 from ruamel.yaml.comments import CommentedMap, CommentedSeq
-
-from regolith.tools import dbpathname
+from ruamel.yaml.constructor import ConstructorError, RoundTripConstructor
+from ruamel.yaml.nodes import MappingNode
+from ruamel.yaml.representer import RoundTripRepresenter
+
+from regolith.chained_db import (
+    CopyOnWriteDict,
+    CopyOnWriteList,
+    copy_on_write,
+    invalidate,
+)
+from regolith.tools import FragmentIndex, IdentityIndex, dbpathname
 
 YAML_BASE_MAP = {CommentedMap: dict,
                  CommentedSeq: list}
 
+DBCACHE_VERSION = 1
+
+
+class BaseTypeConstructor(RoundTripConstructor):
+    """A round-trip constructor that builds plain dicts and lists in place of
+    CommentedMaps and CommentedSeqs while parsing. Scalars keep their
+    round-trip types, so formatting such as float precision and block string
+    styles survives a dump.
+    """
+
+    def construct_yaml_seq(self, node):
+        data = []
+        yield data
+        data.extend(self.construct_sequence(node, deep=True))
+
+    def construct_yaml_map(self, node):
+        data = {}
+        yield data
+        if not isinstance(node, MappingNode):
+            raise ConstructorError(
+                None, None,
+                "expected a mapping node, but found {0!s}".format(node.id),
+                node.start_mark,
+            )
+        merge_map = self.flatten_mapping(node)
+        for key_node, value_node in node.value:
+            key = self.construct_object(key_node, deep=True)
+            if isinstance(key, list):
+                key = tuple(key)
+            if not isinstance(key, Hashable):
+                raise ConstructorError(
+                    "while constructing a mapping", node.start_mark,
+                    "found unhashable key", key_node.start_mark,
+                )
+            value = self.construct_object(value_node, deep=True)
+            if self.check_mapping_key(node, key_node, data, key, value):
+                data[key] = value
+        # keys given explicitly take precedence over merged ones
+        for _, merged in merge_map:
+            for key, value in merged.items():
+                data.setdefault(key, value)
+
+
+BaseTypeConstructor.add_constructor(
+    "tag:yaml.org,2002:seq", BaseTypeConstructor.construct_yaml_seq
+)
+BaseTypeConstructor.add_constructor(
+    "tag:yaml.org,2002:map", BaseTypeConstructor.construct_yaml_map
+)
+# documents taken from copy-on-write views may be written back
+RoundTripRepresenter.add_representer(
+    CopyOnWriteDict, RoundTripRepresenter.represent_dict
+)
+RoundTripRepresenter.add_representer(
+    CopyOnWriteList, RoundTripRepresenter.represent_list
+)
+
 
 def _rec_re_type(i):
-    """Destroy this when ruamel.yaml supports basetypes again"""
+    """Converts CommentedMaps and CommentedSeqs into dicts and lists. This is
+    only needed for documents from loaders other than ``BaseTypeConstructor``
+    based ones."""
     if type(i) in YAML_BASE_MAP:
         base = YAML_BASE_MAP[type(i)]()
         if isinstance(base, dict):
@@ -31,6 +105,30 @@ def _rec_re_type(i):
     return base
 
 
+def _copy_aliases(data, seen=None, ancestors=None):
+    """Replaces the dicts and lists that are reached more than once in data,
+    as the nodes of YAML aliases are, with copies, so that each document owns
+    its values. Recursive structures are left as they are."""
+    if seen is None:
+        seen, ancestors = set(), set()
+    if isinstance(data, dict):
+        keys = list(data)
+    elif isinstance(data, list):
+        keys = range(len(data))
+    else:
+        return
+    ancestors.add(id(data))
+    for k in keys:
+        value = data[k]
+        if not isinstance(value, (dict, list)) or id(value) in ancestors:
+            continue
+        if id(value) in seen:
+            data[k] = value = deepcopy(value)
+        seen.add(id(value))
+        _copy_aliases(value, seen, ancestors)
+    ancestors.discard(id(data))
+
+
 def _id_key(doc):
     return doc["_id"]
 
@@ -55,20 +153,48 @@ def dump_json(filename, docs):
         fh.write(s)
 
 
-def load_yaml(filename, return_inst=False, loader=None):
-    """Loads a YAML file and returns a dict of its documents."""
+def load_yaml(filename, return_inst=False, loader=None, commented=False):
+    """Loads a YAML file and returns a dict of its documents.
+
+    By default the documents are made of plain dicts and lists. If commented
+    is True, the CommentedMaps and CommentedSeqs of the round-trip loader,
+    which carry comments and layout, are returned instead.
+    """
     if loader is None:
         inst = YAML()
+        if not commented:
+            inst.Constructor = BaseTypeConstructor
     else:
         inst = loader
     with open(filename, encoding="utf-8") as fh:
-        docs = inst.load(fh)
+        text = fh.read()
+    docs = inst.load(text)
+    if not commented and type(docs) in YAML_BASE_MAP:
         docs = _rec_re_type(docs)
+    # aliases share the objects of their anchors, and anchors need an "&"
+    if "&" in text:
+        _copy_aliases(docs)
     for _id, doc in docs.items():
         doc["_id"] = _id
     return (docs, inst) if return_inst else docs
 
 
+def load_yaml_fast(filename):
+    """Loads a YAML file and returns a dict of its documents, using the safe
+    loader. This is backed by libyaml when it is available and builds plain
+    dicts and lists directly, but does not keep any formatting information.
+    """
+    inst = YAML(typ="safe")
+    with open(filename, encoding="utf-8") as fh:
+        text = fh.read()
+    docs = inst.load(text)
+    if "&" in text:
+        _copy_aliases(docs)
+    for _id, doc in docs.items():
+        doc["_id"] = _id
+    return docs
+
+
 def dump_yaml(filename, docs, inst=None):
     """Dumps a dict of documents into a file."""
     inst = YAML() if inst is None else inst
@@ -77,14 +203,369 @@ def dump_yaml(filename, docs, inst=None):
     sorted_dict = ruamel.yaml.comments.CommentedMap()
     for k in sorted(docs):
         doc = docs[k]
-        _id = doc.pop("_id")
         sorted_dict[k] = ruamel.yaml.comments.CommentedMap()
         for kk in sorted(doc.keys()):
-            sorted_dict[k][kk] = doc[kk]
+            if kk != "_id":
+                sorted_dict[k][kk] = doc[kk]
     with open(filename, "w", encoding="utf-8") as fh:
         inst.dump(sorted_dict, stream=fh)
 
 
+def _file_hash(filename):
+    """Returns the sha256 hex digest of a file's contents."""
+    h = hashlib.sha256()
+    with open(filename, "rb") as fh:
+        for chunk in iter(lambda: fh.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def dump_if_changed(filename, docs, dump=dump_json):
+    """Dumps a dict of documents with the dump function, but only replaces
+    the file if its contents change.
+
+    Returns
+    -------
+    changed : bool
+        Whether the file was written
+    """
+    tmpfile = filename + ".tmp"
+    dump(tmpfile, docs)
+    if os.path.isfile(filename) and _file_hash(filename) == _file_hash(tmpfile):
+        os.remove(tmpfile)
+        return False
+    os.replace(tmpfile, filename)
+    return True
+
+
+def _cache_filename(filename, loader, cachedir):
+    """Returns the name of the cache file for a collection file parsed with
+    the given loader."""
+    key = hashlib.sha1(os.path.abspath(filename).encode("utf-8")).hexdigest()
+    return os.path.join(cachedir, "{0}.{1}.{2}.pkl".format(
+        os.path.basename(filename), loader.__name__, key[:16]))
+
+
+def load_cached(filename, loader, cachedir):
+    """Loads a collection file through an on-disk cache.
+
+    The cache holds a pickled snapshot of the parsed documents along with the
+    size, mtime, and content hash of the file they came from. The snapshot is
+    used when the size and mtime match, or when only the mtime differs but the
+    content hash still matches. Otherwise the file is parsed with the loader
+    and the snapshot is rewritten.
+
+    Parameters
+    ----------
+    filename : str
+        The collection file to load.
+    loader : callable
+        The function that parses the file, e.g. ``load_yaml``.
+    cachedir : str
+        The directory that holds the cache files.
+
+    Returns
+    -------
+    docs : dict
+        The documents in the collection.
+    """
+    st = os.stat(filename)
+    cachefile = _cache_filename(filename, loader, cachedir)
+    digest = None
+    try:
+        with open(cachefile, "rb") as fh:
+            header = pickle.load(fh)
+            if (header["version"] == DBCACHE_VERSION
+                    and header["size"] == st.st_size):
+                if header["mtime"] == st.st_mtime_ns:
+                    return pickle.load(fh)
+                digest = _file_hash(filename)
+                if header["hash"] == digest:
+                    docs = pickle.load(fh)
+                    _write_cache(cachefile, st, digest, docs)
+                    return docs
+    except Exception:
+        # a missing, stale, or corrupt cache file is just a cache miss
+        pass
+    if digest is None:
+        digest = _file_hash(filename)
+    docs = loader(filename)
+    _write_cache(cachefile, st, digest, docs)
+    return docs
+
+
+def _write_cache(cachefile, st, digest, docs):
+    """Atomically writes a cache file for the given file stats and docs."""
+    header = {"version": DBCACHE_VERSION, "size": st.st_size,
+              "mtime": st.st_mtime_ns, "hash": digest}
+    tmpfile = cachefile + ".{}.tmp".format(os.getpid())
+    with open(tmpfile, "wb") as fh:
+        pickle.dump(header, fh, protocol=pickle.HIGHEST_PROTOCOL)
+        pickle.dump(docs, fh, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmpfile, cachefile)
+
+
+def _load_verbose(loader, filename):
+    """Loads a collection file, announcing it on stderr."""
+    print("loading " + filename + "...", file=sys.stderr)
+    return loader(filename)
+
+
+class Unloaded(object):
+    """Placeholder for a collection that has not been parsed yet.
+
+    Parameters
+    ----------
+    load : callable
+        Zero-argument function that returns the collection.
+    """
+
+    def __init__(self, load):
+        self.load = load
+
+
+class LazyCollections(MutableMapping):
+    """A mapping whose values may be ``Unloaded`` placeholders, which are
+    replaced by the result of their ``load()`` on first access.
+
+    Parameters
+    ----------
+    default_factory : callable or None, optional
+        Called to create the value of a missing key, as in
+        ``collections.defaultdict``. If None, missing keys raise a KeyError.
+    """
+
+    def __init__(self, default_factory=None):
+        self.default_factory = default_factory
+        self._data = {}
+
+    def __getitem__(self, key):
+        try:
+            value = self._data[key]
+        except KeyError:
+            if self.default_factory is None:
+                raise
+            value = self._data[key] = self.default_factory()
+        if isinstance(value, Unloaded):
+            value = self._data[key] = value.load()
+        return value
+
+    def __setitem__(self, key, value):
+        self._data[key] = value
+
+    def __delitem__(self, key):
+        del self._data[key]
+
+    def __contains__(self, key):
+        return key in self._data
+
+    def __iter__(self):
+        return iter(self._data)
+
+    def __len__(self):
+        return len(self._data)
+
+    def __repr__(self):
+        return "{0}({1!r})".format(self.__class__.__name__, self._data)
+
+    def __deepcopy__(self, memo):
+        new = self.__class__(self.default_factory)
+        for key in self:
+            new._data[key] = deepcopy(self[key], memo)
+        return new
+
+    def is_loaded(self, key):
+        """Whether the value for a key has already been loaded."""
+        return not isinstance(self._data.get(key), Unloaded)
+
+
+def _index_json_lines(filename):
+    """Returns a dict mapping the ``_id`` of each document in a JSON-lines
+    file to the (start, end) byte offsets of its line."""
+    offsets = {}
+    start = 0
+    with open(filename, "rb") as fh:
+        for line in fh:
+            stripped = line.rstrip(b"\r\n")
+            if stripped.strip():
+                doc = json.loads(stripped)
+                offsets[doc["_id"]] = (start, start + len(stripped))
+            start += len(line)
+    return offsets
+
+
+class JSONLinesCollection(MutableMapping):
+    """A collection backed by a JSON-lines file, which maps document ids to
+    documents. The file is memory-mapped and each document is only decoded
+    when it is first accessed.
+
+    Parameters
+    ----------
+    filename : str
+        The JSON-lines file, with one document per line.
+    offsets : dict
+        Maps the ``_id`` of each document to the (start, end) byte offsets of
+        its line in the file.
+    """
+
+    def __init__(self, filename, offsets):
+        self.filename = filename
+        # values are either decoded documents or (start, end) offset tuples
+        self._data = dict(offsets)
+        self._fh = open(filename, "rb")
+        if os.fstat(self._fh.fileno()).st_size > 0:
+            self._mm = mmap.mmap(self._fh.fileno(), 0, access=mmap.ACCESS_READ)
+        else:
+            self._mm = None
+
+    def __getitem__(self, key):
+        value = self._data[key]
+        if isinstance(value, tuple):
+            if self._fh.closed:
+                raise ValueError("{0} has been closed".format(self.filename))
+            start, end = value
+            value = self._data[key] = json.loads(self._mm[start:end])
+        return value
+
+    def __setitem__(self, key, value):
+        self._data[key] = value
+
+    def __delitem__(self, key):
+        del self._data[key]
+
+    def __contains__(self, key):
+        return key in self._data
+
+    def __iter__(self):
+        return iter(self._data)
+
+    def __len__(self):
+        return len(self._data)
+
+    def __repr__(self):
+        return "{0}({1!r})".format(self.__class__.__name__, self.filename)
+
+    def __deepcopy__(self, memo):
+        return {key: deepcopy(value, memo) for key, value in self.items()}
+
+    def close(self, load=True):
+        """Releases the file, so that it may be safely overwritten. If load is
+        True, the documents that have not been decoded yet are decoded first,
+        so that the collection can still be used. Otherwise they can no
+        longer be read."""
+        if self._fh.closed:
+            return
+        if load:
+            for key in self:
+                self[key]
+        if self._mm is not None:
+            self._mm.close()
+            self._mm = None
+        self._fh.close()
+
+
+def _is_hashable(value):
+    try:
+        hash(value)
+    except TypeError:
+        return False
+    return True
+
+
+def _matches(doc, filter):
+    """Whether a document has all of the key/value pairs of a filter."""
+    for key, value in filter.items():
+        if key not in doc or doc[key] != value:
+            return False
+    return True
+
+
+class FieldIndex(object):
+    """A hash index from the values of a top-level document field to the ids
+    of the documents with that value. Documents without the field, or whose
+    value is not hashable, are not indexed. The ids of each value are kept in
+    the order the documents were first added, which is their order in the
+    collection, so that the first match is the one a scan would find.
+
+    Parameters
+    ----------
+    field : str
+        The field to index.
+    """
+
+    def __init__(self, field):
+        self.field = field
+        self._ids = {}
+        self._values = {}
+        self._positions = {}
+        self._next_position = 0
+
+    def build(self, coll):
+        """Indexes all of the documents of a collection."""
+        for _id, doc in coll.items():
+            self.add(_id, doc)
+
+    def add(self, _id, doc):
+        """Indexes a document, replacing any previous entry for its id."""
+        self._unindex(_id)
+        if _id not in self._positions:
+            self._positions[_id] = self._next_position
+            self._next_position += 1
+        value = doc.get(self.field, None)
+        if self.field not in doc or not _is_hashable(value):
+            return
+        self._values[_id] = value
+        ids = self._ids.setdefault(value, {})
+        position = self._positions[_id]
+        if ids and self._positions[next(reversed(ids))] > position:
+            ids[_id] = None
+            self._ids[value] = dict.fromkeys(
+                sorted(ids, key=self._positions.__getitem__))
+        else:
+            ids[_id] = None
+
+    def discard(self, _id):
+        """Removes a document id from the index, if it is present."""
+        self._unindex(_id)
+        self._positions.pop(_id, None)
+
+    def _unindex(self, _id):
+        if _id not in self._values:
+            return
+        value = self._values.pop(_id)
+        ids = self._ids[value]
+        del ids[_id]
+        if not ids:
+            del self._ids[value]
+
+    def get(self, value):
+        """Returns the list of ids of the documents with the given value."""
+        return list(self._ids.get(value, ()))
+
+
+def load_json_indexed(filename, indexdir=None):
+    """Loads a JSON-lines file as a ``JSONLinesCollection``.
+
+    Parameters
+    ----------
+    filename : str
+        The JSON-lines file.
+    indexdir : str or None, optional
+        If given, the ``_id`` to byte offset index of the file is stored in
+        this directory and reused while the file is unchanged.
+
+    Returns
+    -------
+    docs : JSONLinesCollection
+        The documents in the collection.
+    """
+    if indexdir is None:
+        offsets = _index_json_lines(filename)
+    else:
+        offsets = load_cached(filename, _index_json_lines, indexdir)
+    return JSONLinesCollection(filename, offsets)
+
+
 def json_to_yaml(inp, out):
     """Converts a JSON file to a YAML one."""
     docs = load_json(inp)
@@ -109,59 +590,161 @@ class FileSystemClient:
         self._collfiletypes = {}
         self._collexts = {}
         self._yamlinsts = {}
+        self._fastloaded = {}
+        self._index_fields = defaultdict(set)
 
     def is_alive(self):
         return not self.closed
 
     def open(self):
-        self.dbs = defaultdict(lambda: defaultdict(dict))
+        if getattr(self.rc, "lazy_load", False):
+            self.dbs = defaultdict(lambda: LazyCollections(dict))
+        else:
+            self.dbs = defaultdict(lambda: defaultdict(dict))
         self.chained_db = {}
+        self._dirty = set()
+        self._indexes = {}
+        self._identity_indexes = {}
+        self._fragment_indexes = {}
         self.closed = False
 
+    def mark_dirty(self, dbname, collname):
+        """Records that a collection has been modified and must be dumped.
+        This is done by the methods that write to the database, and must be
+        called by hand after changing documents in place."""
+        self._dirty.add((dbname, collname))
+        self._identity_indexes.pop(collname, None)
+        self._fragment_indexes.pop(collname, None)
+        invalidate(self.chained_db, collname)
+
+    def create_index(self, dbname, collname, field):
+        """Declares a hash index on a top-level field of a collection, which
+        ``find_one`` and ``update_one`` use for filters on that field. The
+        index is built when it is first needed and is kept in sync by the
+        insert, update, and delete methods of this client. Documents are
+        always indexed by ``_id``, since collections are keyed by it.
+        """
+        self._index_fields[dbname, collname].add(field)
+
+    def _get_indexes(self, dbname, collname):
+        """Returns the field indexes of a collection, building any declared
+        indexes that have not been built yet."""
+        fields = self._index_fields.get((dbname, collname), ())
+        indexes = self._indexes.setdefault((dbname, collname), {})
+        for field in fields:
+            if field not in indexes:
+                index = FieldIndex(field)
+                index.build(self.dbs[dbname][collname])
+                indexes[field] = index
+        return indexes
+
+    def _reindex(self, dbname, collname, ids):
+        """Brings the built indexes of a collection up to date for the given
+        document ids."""
+        indexes = self._indexes.get((dbname, collname), None)
+        if not indexes:
+            return
+        coll = self.dbs[dbname][collname]
+        for _id in ids:
+            doc = coll.get(_id, None)
+            for index in indexes.values():
+                if doc is None:
+                    index.discard(_id)
+                else:
+                    index.add(_id, doc)
+
+    def _collection_files(self, db, dbpath, pattern):
+        """Returns the collection files in dbpath matching a glob pattern."""
+        return [
+            file
+            for file in iglob(os.path.join(dbpath, pattern))
+            if file not in db["blacklist"]
+            and len(db["whitelist"]) == 0
+            or os.path.basename(file).split(".")[0] in db["whitelist"]
+        ]
+
+    def _cachedir(self):
+        """Returns the directory for the parsed collection cache and the
+        JSON-lines indexes, creating it if needed."""
+        cachedir = os.path.join(self.rc.builddir, "_dbcache")
+        os.makedirs(cachedir, exist_ok=True)
+        return cachedir
+
+    def _cached(self, loader):
+        """Wraps a file loader with the on-disk cache if the ``dbcache`` run
+        control value is true."""
+        if not getattr(self.rc, "dbcache", False):
+            return loader
+        return partial(load_cached, loader=loader, cachedir=self._cachedir())
+
+    def _load_files(self, loader, files, executor):
+        """Yields (filename, docs) pairs for the files given. If the
+        ``lazy_load`` run control value is true, docs is an ``Unloaded``
+        placeholder that parses the file on first access. Otherwise, if the
+        ``load_workers`` run control value is greater than one, the files are
+        parsed concurrently in an executor of the given type.
+        """
+        if getattr(self.rc, "lazy_load", False):
+            for f in files:
+                yield f, Unloaded(partial(_load_verbose, loader, f))
+            return
+        workers = getattr(self.rc, "load_workers", 1) or 1
+        if workers <= 1 or len(files) <= 1:
+            for f in files:
+                yield f, _load_verbose(loader, f)
+            return
+        for f in files:
+            print("loading " + f + "...", file=sys.stderr)
+        with executor(max_workers=min(workers, len(files))) as pool:
+            yield from zip(files, pool.map(loader, files))
+
     def load_json(self, db, dbpath):
         """Loads the JSON part of a database."""
         dbs = self.dbs
-        for f in [
-            file
-            for file in iglob(os.path.join(dbpath, "*.json"))
-            if file not in db["blacklist"]
-               and len(db["whitelist"]) == 0
-               or os.path.basename(file).split(".")[0] in db["whitelist"]
-        ]:
+        files = self._collection_files(db, dbpath, "*.json")
+        if getattr(self.rc, "indexed_json", False):
+            loader = partial(load_json_indexed, indexdir=self._cachedir())
+        else:
+            loader = self._cached(load_json)
+        # JSON decoding is fast enough that threads suffice
+        for f, coll in self._load_files(loader, files, ThreadPoolExecutor):
             collfilename = os.path.split(f)[-1]
             base, ext = os.path.splitext(collfilename)
             self._collfiletypes[base] = "json"
-            print("loading " + f + "...", file=sys.stderr)
-            dbs[db["name"]][base] = load_json(f)
+            dbs[db["name"]][base] = coll
 
     def load_yaml(self, db, dbpath):
         """Loads the YAML part of a database."""
         dbs = self.dbs
-        for f in [
-            file
-            for file in iglob(os.path.join(dbpath, "*.y*ml"))
-            if file not in db["blacklist"]
-            and len(db["whitelist"]) == 0
-            or os.path.basename(file).split(".")[0] in db["whitelist"]
-        ]:
+        files = self._collection_files(db, dbpath, "*.y*ml")
+        fast = getattr(self.rc, "fast_load", False)
+        # round-trip YAML parsing is CPU-bound, so use processes
+        loader = self._cached(load_yaml_fast if fast else load_yaml)
+        for f, coll in self._load_files(loader, files, ProcessPoolExecutor):
             collfilename = os.path.split(f)[-1]
             base, ext = os.path.splitext(collfilename)
+            if fast:
+                self._fastloaded[db["name"], base] = f
             self._collexts[base] = ext
             self._collfiletypes[base] = "yaml"
-            print("loading " + f + "...", file=sys.stderr)
-            coll, inst = load_yaml(f, return_inst=True)
             dbs[db["name"]][base] = coll
-            self._yamlinsts[dbpath, base] = inst
+            self._yamlinsts[dbpath, base] = YAML()
 
     def load_database(self, db):
-        """Loads a database."""
+        """Loads a database. Indexes for the fields listed per collection in
+        the ``indexes`` run control value are declared as well."""
         dbpath = dbpathname(db, self.rc)
         self.load_json(db, dbpath)
         self.load_yaml(db, dbpath)
+        for collname, fields in getattr(self.rc, "indexes", {}).items():
+            for field in fields:
+                self.create_index(db["name"], collname, field)
 
     def dump_json(self, docs, collname, dbpath):
         """Dumps json docs and returns filename"""
         f = os.path.join(dbpath, collname + ".json")
+        if isinstance(docs, JSONLinesCollection):
+            docs.close()
         dump_json(f, docs)
         filename = os.path.split(f)[-1]
         return filename
@@ -177,23 +760,59 @@ class FileSystemClient:
         return filename
 
     def dump_database(self, db):
-        """Dumps a database back to the filesystem."""
+        """Dumps a database back to the filesystem. Only the collections that
+        have been modified through this client are written out, and only the
+        files whose contents changed are returned. Collections that were
+        loaded with ``fast_load`` can't be dumped, since their comments and
+        formatting would be lost.
+        """
+        fastloaded = sorted(collname for dbname, collname in self._dirty
+                            if dbname == db["name"]
+                            and (dbname, collname) in self._fastloaded)
+        if fastloaded:
+            raise RuntimeError(
+                "{0} of database {1} were loaded with fast_load, so dumping "
+                "them would lose their comments and formatting; turn "
+                "fast_load off to update them".format(
+                    ", ".join(fastloaded), db["name"]))
         dbpath = dbpathname(db, self.rc)
         os.makedirs(dbpath, exist_ok=True)
         to_add = []
-        for collname, collection in self.dbs[db["name"]].items():
+        colls = self.dbs[db["name"]]
+        for collname in list(colls):
+            if (db["name"], collname) not in self._dirty:
+                continue
+            collection = colls[collname]
             print("dumping " + collname + "...", file=sys.stderr)
             filetype = self._collfiletypes.get(collname, "yaml")
+            if filetype == "json":
+                ext = ".json"
+            else:
+                ext = self._collexts.get(collname, ".yaml")
+            f = os.path.join(dbpath, collname + ext)
+            before = _file_hash(f) if os.path.isfile(f) else None
             if filetype == "json":
                 filename = self.dump_json(collection, collname, dbpath)
             elif filetype == "yaml":
                 filename = self.dump_yaml(collection, collname, dbpath)
             else:
                 raise ValueError("did not recognize file type for regolith")
-            to_add.append(os.path.join(db["path"], filename))
+            self._dirty.discard((db["name"], collname))
+            if _file_hash(f) != before:
+                to_add.append(os.path.join(db["path"], filename))
         return to_add
 
     def close(self):
+        """Closes the client, releasing the files of the collections that
+        are read from JSON-lines files."""
+        for colls in (self.dbs or {}).values():
+            for collname in colls:
+                if isinstance(colls, LazyCollections) \
+                        and not colls.is_loaded(collname):
+                    continue
+                coll = colls[collname]
+                if isinstance(coll, JSONLinesCollection):
+                    coll.close(load=False)
         self.dbs = None
         self.closed = True
 
@@ -207,38 +826,82 @@ class FileSystemClient:
         """Returns the collaction names for a database."""
         return set(self.dbs[dbname].keys())
 
-    def all_documents(self, collname, copy=True):
-        """Returns an iteratable over all documents in a collection."""
-        if copy:
+    def all_documents(self, collname, copy=True, cow=False):
+        """Returns an iteratable over all documents in a collection. If copy
+        is True, the documents are deep copies, or copy-on-write views if cow
+        is also True, so that changing them leaves the database untouched."""
+        if copy and cow:
+            return [copy_on_write(doc)
+                    for doc in self.chained_db.get(collname, {}).values()]
+        elif copy:
             return deepcopy(self.chained_db.get(collname, {})).values()
         return self.chained_db.get(collname, {}).values()
 
+    def identity_index(self, collname):
+        """Returns an ``IdentityIndex`` of the documents in a collection by
+        their ``_id``, ``name`` and ``aka``, ignoring case. It is built when
+        it is first needed and is kept until the collection is written to."""
+        if collname not in self._identity_indexes:
+            self._identity_indexes[collname] = IdentityIndex(
+                self.all_documents(collname, copy=False),
+                case_sensitive=False)
+        return self._identity_indexes[collname]
+
+    def fragment_index(self, collname):
+        """Returns a ``FragmentIndex`` of the documents in a collection on the
+        fields listed for it in the ``fragment_indexes`` run control value.
+        It is built when it is first needed and is kept until the collection
+        is written to."""
+        if collname not in self._fragment_indexes:
+            fields = getattr(self.rc, "fragment_indexes", {}).get(collname, ())
+            self._fragment_indexes[collname] = FragmentIndex(
+                self.all_documents(collname, copy=False), fields)
+        return self._fragment_indexes[collname]
+
     def insert_one(self, dbname, collname, doc):
         """Inserts one document to a database/collection."""
         coll = self.dbs[dbname][collname]
         coll[doc["_id"]] = doc
+        self._reindex(dbname, collname, [doc["_id"]])
+        self.mark_dirty(dbname, collname)
 
     def insert_many(self, dbname, collname, docs):
         """Inserts many documents into a database/collection."""
         coll = self.dbs[dbname][collname]
         for doc in docs:
             coll[doc["_id"]] = doc
+        self._reindex(dbname, collname, [doc["_id"] for doc in docs])
+        self.mark_dirty(dbname, collname)
 
     def delete_one(self, dbname, collname, doc):
         """Removes a single document from a collection"""
         coll = self.dbs[dbname][collname]
         del coll[doc["_id"]]
+        self._reindex(dbname, collname, [doc["_id"]])
+        self.mark_dirty(dbname, collname)
 
     def find_one(self, dbname, collname, filter):
         """Finds the first document matching filter."""
         coll = self.dbs[dbname][collname]
+        _id = filter.get("_id", None)
+        if _id is not None and _is_hashable(_id):
+            # documents are keyed by their id, so skip the scan
+            doc = coll.get(_id, None)
+            if doc is None or not _matches(doc, filter):
+                return None
+            return doc
+        indexes = self._get_indexes(dbname, collname)
+        candidates = [indexes[key].get(value)
+                      for key, value in filter.items()
+                      if key in indexes and _is_hashable(value)]
+        if candidates:
+            for _id in min(candidates, key=len):
+                doc = coll[_id]
+                if _matches(doc, filter):
+                    return doc
+            return None
         for doc in coll.values():
-            matches = True
-            for key, value in filter.items():
-                if key not in doc or doc[key] != value:
-                    matches = False
-                    break
-            if matches:
+            if _matches(doc, filter):
                 return doc
 
     def update_one(self, dbname, collname, filter, update, **kwargs):
@@ -248,3 +911,5 @@ class FileSystemClient:
         newdoc = dict(filter if doc is None else doc)
         newdoc.update(update)
         coll[newdoc["_id"]] = newdoc
+        self._reindex(dbname, collname, [newdoc["_id"]])
+        self.mark_dirty(dbname, collname)
@@ -6,7 +6,7 @@ from regolith.fsclient import _id_key
 from regolith.tools import (
     all_docs_from_collection,
     get_pi_id,
-    search_collection,
+    key_value_pair_filter,
     collection_str,
 )
 HELPER_TARGET = "lister"
@@ -20,7 +20,8 @@ def subparser(subpi):
         nargs="+",
         help="Search the given collection by key-value pairs. "
              "e.g. 'regolith helper lister -f name simon' will "
-             "return the id of all the people who's name contains simon.")
+             "return the id of all the people who's name contains simon. "
+             "Keys may be dotted paths, such as employment.organization.")
     subpi.add_argument(
         "-r",  "--return_fields",
         nargs="+",
@@ -72,7 +73,8 @@ class GeneralListerHelper(SoutHelperBase):
         keys = sorted(set([i for k in coll for i in k.keys()]))
         list_keys = []
         if rc.kv_filter:
-            list_keys.extend([rc.kv_filter[n] for n in range(len(rc.kv_filter)) if n % 2 == 0])
+            # filter keys may be dotted paths into the documents
+            list_keys.extend([rc.kv_filter[n].split(".")[0] for n in range(len(rc.kv_filter)) if n % 2 == 0])
         if rc.return_fields:
             list_keys.extend(rc.return_fields)
         for i in list_keys:
@@ -81,15 +83,12 @@ class GeneralListerHelper(SoutHelperBase):
         if len(coll) == 0:
             raise RuntimeError('This collection is empty or does not exist. Please inform a valid collection.')
         if rc.kv_filter:
-            filter_result = search_collection(coll, rc.kv_filter).strip()
-            if filter_result == '':
+            found = key_value_pair_filter(coll, rc.kv_filter)
+            if len(found) == 0:
                 print("There are no results that match your search.")
             else:
-                if rc.return_fields:
-                    print("Results of your search:\n"
-                            f"{(search_collection(coll, rc.kv_filter, rc.return_fields).strip())}")
-                else:
-                    print(f"Results of your search:\n{filter_result}")
+                print("Results of your search:\n"
+                      f"{collection_str(found, rc.return_fields).strip()}")
         if rc.return_fields and not rc.kv_filter:
             print(f"Results of your search:\n{collection_str(coll, rc.return_fields).strip()}")
         if rc.keys:
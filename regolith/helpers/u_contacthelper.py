@@ -8,7 +8,10 @@ import uuid
 
 from regolith.helpers.basehelper import DbHelperBase
 from regolith.fsclient import _id_key
-from regolith.tools import all_docs_from_collection, fragment_retrieval
+from regolith.tools import (
+    all_docs_from_collection,
+    collection_fragment_retrieval,
+)
 
 
 TARGET_COLL = "contacts"
@@ -73,7 +76,8 @@ class ContactUpdaterHelper(DbHelperBase):
 
     def db_updater(self):
         rc = self.rc
-        found_contacts = fragment_retrieval(self.gtx['contacts'], ["_id", "aka", "name"], rc.fragmentname)
+        found_contacts = collection_fragment_retrieval(
+            rc.client, rc.coll, ["_id", "aka", "name"], rc.fragmentname)
         found_contacts.sort(key=lambda x: x['_id'], reverse=False)
         index_list = list(range(2, (len(found_contacts) + 2)))
         if not rc.index:
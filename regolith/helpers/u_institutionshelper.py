@@ -3,7 +3,10 @@ Helper for updating/adding  to the projecta collection.
 """
 from regolith.helpers.basehelper import DbHelperBase
 from regolith.fsclient import _id_key
-from regolith.tools import all_docs_from_collection, fragment_retrieval
+from regolith.tools import (
+    all_docs_from_collection,
+    collection_fragment_retrieval,
+)
 from itertools import chain
 import uuid
 import datetime as dt
@@ -102,7 +105,8 @@ class InstitutionsUpdaterHelper(DbHelperBase):
             departments = target_inst.get('departments', {})
             schools = target_inst.get('schools', {})
         else:
-            inst = fragment_retrieval(self.gtx["institutions"], ["_id", "name", "aka"], rc.institution_id)
+            inst = collection_fragment_retrieval(
+                rc.client, rc.coll, ["_id", "name", "aka"], rc.institution_id)
             inst.sort(key=lambda x: x['_id'], reverse=False)
             if not rc.index:
                 print("Please rerun the helper specifying '-n list-index' to update item number 'list-index':")
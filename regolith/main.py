@@ -12,7 +12,12 @@ from regolith import storage
 from regolith.builder import BUILDERS
 from regolith.commands import INGEST_COLL_LU
 from regolith.helper import HELPERS
-from regolith.runcontrol import DEFAULT_RC, load_rcfile, filter_databases
+from regolith.runcontrol import (
+    DEFAULT_RC,
+    NotSpecified,
+    load_rcfile,
+    filter_databases,
+)
 from regolith.schemas import SCHEMAS
 from regolith.tools import update_schemas
 
@@ -34,7 +39,8 @@ CONNECTED_COMMANDS = {
     "classlist": commands.classlist,
     "validate": commands.validate,
     "helper": commands.helper,
-    "fs-to-mongo": commands.fs_to_mongo
+    "fs-to-mongo": commands.fs_to_mongo,
+    "fs-to-sqlite": commands.fs_to_sqlite,
 }
 
 NEED_RC = set(CONNECTED_COMMANDS.keys())
@@ -43,6 +49,13 @@ NEED_RC |= {"rc", "deploy", "store"}
 
 def create_parser():
     p = ArgumentParser()
+    p.add_argument(
+        "--offline",
+        action="store_true",
+        default=NotSpecified,
+        help="never pull or push git and hg databases, use the copies that "
+             "have already been cloned",
+    )
     subp = p.add_subparsers(title="cmd", dest="cmd")
 
     # helper subparser
@@ -274,6 +287,22 @@ def create_parser():
                                     "on the localhost on port number 27017.",
                      dest="host",
                      default=None)
+    ftm.add_argument("--upsert", help="Replace the documents that are already in mongodb, instead of "
+                                      "inserting new ones, to sync a database again.",
+                     dest="upsert", action="store_true", default=False)
+    ftm.add_argument("--batch-size", help="The number of documents sent to mongodb at a time. Defaults to "
+                                          "1000.",
+                     dest="mongo_batch_size", type=int, default=NotSpecified)
+    ftm.add_argument("--mongoimport", help="Import each file with the mongoimport tool instead of from "
+                                           "this process.",
+                     dest="mongoimport", action="store_true", default=False)
+
+    # fs-to-sqlite subparser
+    subp.add_parser(
+        "fs-to-sqlite",
+        help="Import database from filesystem to an SQLite database file. The file is given by the "
+             "'sqlitepath' key in 'regolithrc.json', which defaults to '${builddir}/regolith.sqlite'."
+    )
 
     # Validator
     val = subp.add_parser("validate", help="Validates db")
@@ -332,6 +361,7 @@ def main(args=None):
             dbs = commands.build_db_check(rc)
         elif rc.cmd == 'helper':
             dbs = commands.helper_db_check(rc)
+        commands.fast_load_check(rc)
         with connect(rc, dbs=dbs) as rc.client:
             CONNECTED_COMMANDS[rc.cmd](rc)
 
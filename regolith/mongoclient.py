@@ -6,6 +6,7 @@ import subprocess
 import sys
 import time
 from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
 from copy import deepcopy
 from pathlib import Path
 from tempfile import TemporaryDirectory
@@ -28,7 +29,8 @@ except ImportError:
 
 from pymongo.collection import Collection
 
-from regolith.tools import dbpathname, fallback
+from regolith.chained_db import copy_on_write
+from regolith.tools import FragmentIndex, IdentityIndex, dbpathname, fallback
 from regolith import fsclient
 
 if not MONGO_AVAILABLE:
@@ -96,15 +98,155 @@ def import_yamls(dbpath: str, dbname: str, host: str = None, uri: str = None) ->
     with TemporaryDirectory() as tempd:
         for yaml_file in yaml_files:
             json_file = Path(tempd).joinpath(yaml_file.with_suffix('.json').name)
-            loader = YAML(typ='safe')
-            loader.constructor.yaml_constructors[u'tag:yaml.org,2002:timestamp'] = \
-                loader.constructor.yaml_constructors[u'tag:yaml.org,2002:str']
-            fsclient.yaml_to_json(str(yaml_file), str(json_file), loader=loader)
+            fsclient.yaml_to_json(str(yaml_file), str(json_file), loader=_import_loader())
         import_jsons(tempd, dbname, host=host, uri=uri)
     return
 
 
-def load_mongo_col(col: Collection) -> dict:
+def _import_loader() -> YAML:
+    """Returns the YAML loader for importing, which keeps timestamps as strings as they would be in JSON."""
+    loader = YAML(typ='safe')
+    loader.constructor.yaml_constructors[u'tag:yaml.org,2002:timestamp'] = \
+        loader.constructor.yaml_constructors[u'tag:yaml.org,2002:str']
+    return loader
+
+
+def load_import_file(path: str) -> dict:
+    """Load a json or yaml collection file as it would be imported to mongo db.
+
+    Parameters
+    ----------
+    path : str
+        The path to the collection file.
+
+    Returns
+    -------
+    docs : dict
+        The documents, keyed by their '_id'.
+    """
+    if path.endswith('.json'):
+        return fsclient.load_json(path)
+    return fsclient.load_yaml(path, loader=_import_loader())
+
+
+def bulk_import(col: Collection, docs, batch_size: int = 1000, upsert: bool = False) -> int:
+    """Write documents to a collection in batches, without stopping at the first error in a batch.
+
+    Parameters
+    ----------
+    col : Collection
+        The mongodb collection.
+
+    docs : iterable of dict
+        The documents to write.
+
+    batch_size : int
+        The number of documents sent to the server at a time.
+
+    upsert : bool
+        If True, the documents replace the ones with the same '_id', or are inserted if there are none, so
+        that a collection can be synced again. Otherwise they are inserted.
+
+    Returns
+    -------
+    n : int
+        The number of documents written.
+    """
+    def write(batch):
+        if upsert:
+            col.bulk_write([pymongo.ReplaceOne({'_id': d['_id']}, d, upsert=True) for d in batch],
+                           ordered=False)
+        else:
+            col.insert_many(batch, ordered=False)
+        return len(batch)
+
+    n = 0
+    batch = []
+    for doc in docs:
+        batch.append(doc)
+        if len(batch) >= batch_size:
+            n += write(batch)
+            batch = []
+    if batch:
+        n += write(batch)
+    return n
+
+
+def import_collections(mongodb, dbpath: str, blacklist=(), batch_size: int = 1000, upsert: bool = False,
+                       workers: int = None) -> dict:
+    """Import the json and yaml files of a database folder to mongo db in this process.
+
+    Each file will be a collection in the database. The files are parsed and written concurrently, and the
+    documents are sent with ``bulk_import``.
+
+    Parameters
+    ----------
+    mongodb : Database
+        The mongo database.
+
+    dbpath : str
+        The path to the db folder.
+
+    blacklist : iterable of str
+        The file names to skip.
+
+    batch_size : int
+        The number of documents sent to the server at a time.
+
+    upsert : bool
+        Whether to replace existing documents instead of inserting.
+
+    workers : int
+        The number of collections to import at once. By default, all of them.
+
+    Returns
+    -------
+    counts : dict
+        The number of documents written to each collection.
+    """
+    paths = [p for p in itertools.chain(Path(dbpath).glob('*.json'), Path(dbpath).glob('*.yaml'),
+                                        Path(dbpath).glob('*.yml'))
+             if p.name not in blacklist]
+
+    def import_one(path):
+        print("importing " + str(path) + "...", file=sys.stderr)
+        docs = load_import_file(str(path))
+        return bulk_import(mongodb[path.stem], docs.values(), batch_size=batch_size, upsert=upsert)
+
+    if len(paths) == 0:
+        return {}
+    with ThreadPoolExecutor(max_workers=workers or len(paths)) as executor:
+        counts = executor.map(import_one, paths)
+        return {path.stem: n for path, n in zip(paths, counts)}
+
+
+def export_collection(col: Collection, filename: str, batch_size: int = 1000) -> bool:
+    """Export a mongo collection to a file in the format of ``fsclient.dump_yaml`` if it is a yaml file and of
+    ``fsclient.dump_json`` otherwise. The file is only written if its contents change.
+
+    Parameters
+    ----------
+    col : Collection
+        The mongodb collection.
+
+    filename : str
+        The file to write.
+
+    batch_size : int
+        The number of documents the cursor gets from the server at a time.
+
+    Returns
+    -------
+    changed : bool
+        Whether the file was written.
+    """
+    docs = {doc['_id']: doc for doc in col.find({}, batch_size=batch_size)}
+    if filename.endswith(('.yaml', '.yml')):
+        return fsclient.dump_if_changed(filename, docs, dump=fsclient.dump_yaml)
+    return fsclient.dump_if_changed(filename, docs, dump=fsclient.dump_json)
+
+
+def load_mongo_col(col: Collection, projection: list = None) -> dict:
     """Load the pymongo collection to a dictionary.
 
     In the dictionary. The key will be the '_id' and in each value which is a dictionary there will also be a
@@ -115,16 +257,25 @@ def load_mongo_col(col: Collection) -> dict:
     col : Collection
         The mongodb collection.
 
+    projection : list, optional
+        The fields of the documents to load. The '_id' is always loaded. If None, the whole documents are
+        loaded.
+
     Returns
     -------
     dct : dict
         A dictionary with all the info in the collection.
     """
     return {
-        doc['_id']: doc for doc in col.find({})
+        doc['_id']: doc for doc in col.find({}, projection)
     }
 
 
+PING_TIMEOUT_MS = 1000
+"""How long a liveness check waits for a server to be selected, in milliseconds. Other commands use
+pymongo's default server selection timeout."""
+
+
 @fallback(ON_PYMONGO_V2, None)
 class InsertOneProxy(object):
     def __init__(self, inserted_id, acknowledged):
@@ -148,6 +299,9 @@ class MongoClient:
 
     proc : Popen
         The Popen of 'mongod --dpath <mongodbpath>'. The 'mongodbpath' is from rc.
+
+    The 'mongo_pool_size' attribute of the rc sets the most connections the client keeps open, and
+    'mongo_timeout' the seconds to wait for a newly started server to answer.
     """
 
     def __init__(self, rc):
@@ -157,9 +311,13 @@ class MongoClient:
             )
         self.rc = rc
         self.client = None
+        self.host = None
+        self._pinger = None
         self.proc = None
         self.dbs = defaultdict(lambda: defaultdict(dict))
         self.chained_db = dict()
+        self._identity_indexes = {}
+        self._fragment_indexes = {}
         self.closed = True
         # actually startup mongo
         self.open()
@@ -186,37 +344,69 @@ class MongoClient:
             return False
         elif ON_PYMONGO_V2:
             return self.client.alive()
-        elif ON_PYMONGO_V3:
-            cmd = ["mongostat", "--host", "localhost", "-n", "1"]
-            try:
-                subprocess.check_call(cmd)
-                alive = True
-            except subprocess.CalledProcessError:
-                alive = False
-            return alive
-        else:
+        # pinged from a separate client, so that only the ping gives up quickly
+        if self._pinger is None:
+            self._pinger = pymongo.MongoClient(self.host, serverSelectionTimeoutMS=PING_TIMEOUT_MS)
+        try:
+            self._pinger.admin.command("ping")
+        except pymongo.errors.PyMongoError:
             return False
+        return True
+
+    def _wait_until_alive(self, timeout, delay=0.01, max_delay=1.0):
+        """Polls the server with delays that double from delay up to max_delay, until it is alive or
+        timeout seconds have passed. Gives up at once if the mongod that was started has failed."""
+        deadline = time.monotonic() + timeout
+        while not self.is_alive():
+            # with --fork, mongod exits with 0 once the server is running in the background
+            returncode = None if self.proc is None else self.proc.poll()
+            if returncode:
+                raise RuntimeError(
+                    "mongod exited with status {0} before it became ready".format(returncode)
+                )
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise RuntimeError(
+                    "mongod did not become ready within {0} seconds".format(timeout)
+                )
+            time.sleep(min(delay, remaining))
+            delay = min(2 * delay, max_delay)
+
+    def _connect(self, host):
+        """Makes the pymongo client. Connections are made in the background, so a server that is not
+        running yet can still be connected to once it starts."""
+        if ON_PYMONGO_V2:
+            return pymongo.MongoClient(host)
+        kwargs = {}
+        pool_size = getattr(self.rc, 'mongo_pool_size', None)
+        if pool_size is not None:
+            kwargs["maxPoolSize"] = pool_size
+        return pymongo.MongoClient(host, **kwargs)
 
     def open(self):
-        """Opens the database client"""
+        """Opens the database client. If no server answers, a local mongod is started, and this waits
+        until it answers."""
         rc = self.rc
         if hasattr(rc, 'host'):
             host = getattr(rc, 'host')
         else:
             dbs = getattr(rc, 'databases')
             host = dbs[0]['url']
-        self.client = pymongo.MongoClient(host)
+        self.host = host
+        self.client = self._connect(host)
         if not self.is_alive():
-            # we need to wait for the server to startup
             self._preclean()
             self._startserver()
-            time.sleep(0.1)
+            self._wait_until_alive(getattr(rc, 'mongo_timeout', 30.0))
         self.closed = False
 
     def load_database(self, db: dict):
         """Load the database information from mongo database.
 
-        It populate the 'dbs' attribute with a dictionary like {database: {collection: docs_dict}}.
+        It populate the 'dbs' attribute with a dictionary like {database: {collection: docs_dict}}. Only the
+        collections in the 'whitelist' of the database are loaded, or all of them if it is empty. The
+        'projections' attribute of the rc, if any, maps collection names to the fields of their documents to
+        load.
 
         Parameters
         ----------
@@ -226,14 +416,23 @@ class MongoClient:
         dbs: dict = self.dbs
         client: pymongo.MongoClient = self.client
         mongodb = client[db['name']]
+        whitelist = db.get('whitelist') or []
+        projections = getattr(self.rc, 'projections', None) or {}
         for colname in mongodb.list_collection_names():
+            if len(whitelist) > 0 and colname not in whitelist:
+                continue
             col = mongodb[colname]
-            dbs[db['name']][colname] = load_mongo_col(col)
+            dbs[db['name']][colname] = load_mongo_col(
+                col, projection=projections.get(colname, None))
         return
 
     def import_database(self, db: dict):
         """Import the database from filesystem to the mongo backend.
 
+        The documents are written with pymongo from this process. The 'mongo_batch_size' and 'upsert'
+        attributes of the rc set the batch size and whether existing documents are replaced. If the
+        'mongoimport' attribute of the rc is True, the 'mongoimport' tool is run on each file instead.
+
         Parameters
         ----------
         db : dict
@@ -243,35 +442,57 @@ class MongoClient:
         uri = db.get('dst_url', None)
         dbpath = dbpathname(db, self.rc)
         dbname = db['name']
-        import_jsons(dbpath, dbname, host=host, uri=uri)
-        import_yamls(dbpath, dbname, host=host, uri=uri)
+        if getattr(self.rc, 'mongoimport', False):
+            import_jsons(dbpath, dbname, host=host, uri=uri)
+            import_yamls(dbpath, dbname, host=host, uri=uri)
+            return
+        if uri is None:
+            client = self.client
+        else:
+            client = pymongo.MongoClient(uri)
+        try:
+            import_collections(client[dbname], dbpath, blacklist=db.get('blacklist', ()),
+                               batch_size=getattr(self.rc, 'mongo_batch_size', None) or 1000,
+                               upsert=getattr(self.rc, 'upsert', False))
+        finally:
+            if client is not self.client:
+                client.close()
         return
 
     def dump_database(self, db):
-        """Dumps a database dict via mongoexport."""
+        """Dumps a database to the filesystem. Each collection is written as yaml if there is already a yaml
+        file for it, and as json otherwise. The collections are exported concurrently, and only the files
+        whose contents changed are written and returned."""
         dbpath = dbpathname(db, self.rc)
         os.makedirs(dbpath, exist_ok=True)
-        to_add = []
-        colls = self.client[db["name"]].collection_names(
-            include_system_collections=False
-        )
+        mongodb = self.client[db["name"]]
+        colls = [c for c in mongodb.list_collection_names() if not c.startswith("system.")]
+        filenames = {}
         for collection in colls:
-            f = os.path.join(dbpath, collection + ".json")
-            cmd = [
-                "mongoexport",
-                "--db",
-                db["name"],
-                "--collection",
-                collection,
-                "--out",
-                f,
-            ]
-            subprocess.check_call(cmd)
-            to_add.append(os.path.join(db["path"], collection + ".json"))
-        return to_add
+            filenames[collection] = collection + ".json"
+            for ext in (".yaml", ".yml"):
+                if os.path.isfile(os.path.join(dbpath, collection + ext)):
+                    filenames[collection] = collection + ext
+        if len(colls) == 0:
+            return []
+        batch_size = getattr(self.rc, 'mongo_batch_size', None) or 1000
+
+        def export(collection):
+            print("dumping " + collection + "...", file=sys.stderr)
+            return export_collection(mongodb[collection], os.path.join(dbpath, filenames[collection]),
+                                     batch_size=batch_size)
+
+        with ThreadPoolExecutor(max_workers=len(colls)) as executor:
+            changed = list(executor.map(export, colls))
+        return [os.path.join(db["path"], filenames[c]) for c, ch in zip(colls, changed) if ch]
 
     def close(self):
         """Closes the database connection."""
+        if self.client is not None:
+            self.client.close()
+        if self._pinger is not None:
+            self._pinger.close()
+            self._pinger = None
         self.closed = True
         return
 
@@ -285,14 +506,42 @@ class MongoClient:
         """Returns the collection names for the database name."""
         return self.client[dbname].collection_names()
 
-    def all_documents(self, collname, copy=True):
-        """Returns an iterable over all documents in a collection."""
-        if copy:
+    def all_documents(self, collname, copy=True, cow=False):
+        """Returns an iterable over all documents in a collection. If copy
+        is True, the documents are deep copies, or copy-on-write views if cow
+        is also True, so that changing them leaves the database untouched."""
+        if copy and cow:
+            return [copy_on_write(doc)
+                    for doc in self.chained_db.get(collname, {}).values()]
+        elif copy:
             return deepcopy(self.chained_db.get(collname, {})).values()
         return self.chained_db.get(collname, {}).values()
 
+    def identity_index(self, collname):
+        """Returns an ``IdentityIndex`` of the documents in a collection by
+        their ``_id``, ``name`` and ``aka``, ignoring case. It is built when
+        it is first needed and is kept until the collection is written to."""
+        if collname not in self._identity_indexes:
+            self._identity_indexes[collname] = IdentityIndex(
+                self.all_documents(collname, copy=False),
+                case_sensitive=False)
+        return self._identity_indexes[collname]
+
+    def fragment_index(self, collname):
+        """Returns a ``FragmentIndex`` of the documents in a collection on the
+        fields listed for it in the ``fragment_indexes`` run control value.
+        It is built when it is first needed and is kept until the collection
+        is written to."""
+        if collname not in self._fragment_indexes:
+            fields = getattr(self.rc, "fragment_indexes", {}).get(collname, ())
+            self._fragment_indexes[collname] = FragmentIndex(
+                self.all_documents(collname, copy=False), fields)
+        return self._fragment_indexes[collname]
+
     def insert_one(self, dbname, collname, doc):
         """Inserts one document to a database/collection."""
+        self._identity_indexes.pop(collname, None)
+        self._fragment_indexes.pop(collname, None)
         coll = self.client[dbname][collname]
         if ON_PYMONGO_V2:
             i = coll.insert(doc)
@@ -302,6 +551,8 @@ class MongoClient:
 
     def insert_many(self, dbname, collname, docs):
         """Inserts many documents into a database/collection."""
+        self._identity_indexes.pop(collname, None)
+        self._fragment_indexes.pop(collname, None)
         coll = self.client[dbname][collname]
         if ON_PYMONGO_V2:
             return coll.insert(docs)
@@ -310,6 +561,8 @@ class MongoClient:
 
     def delete_one(self, dbname, collname, doc):
         """Removes a single document from a collection"""
+        self._identity_indexes.pop(collname, None)
+        self._fragment_indexes.pop(collname, None)
         coll = self.client[dbname][collname]
         if ON_PYMONGO_V2:
             return coll.remove(doc, multi=False)
@@ -318,6 +571,8 @@ class MongoClient:
 
     def update_one(self, dbname, collname, filter, update, **kwargs):
         """Updates one document."""
+        self._identity_indexes.pop(collname, None)
+        self._fragment_indexes.pop(collname, None)
         coll = self.client[dbname][collname]
         if ON_PYMONGO_V2:
             doc = coll.find_one(filter)
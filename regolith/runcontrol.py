@@ -236,7 +236,12 @@ DEFAULT_RC = RunControl(
     backend="filesystem",
     builddir="_build",
     mongodbpath=property(lambda self: os.path.join(self.builddir, "_dbpath")),
+    sqlitepath=property(
+        lambda self: os.path.join(self.builddir, "regolith.sqlite")
+    ),
     local=False,
+    offline=False,
+    mongo_batch_size=1000,
     user_config=os.path.expanduser("~/.config/regolith/user.json"),
     force=False,
 )
@@ -0,0 +1,411 @@
+"""Client interface for a local SQLite database."""
+import datetime
+import json
+import os
+import sqlite3
+import sys
+from collections import defaultdict
+from collections.abc import MutableMapping
+from copy import deepcopy
+from glob import iglob
+
+from regolith.chained_db import copy_on_write, invalidate
+from regolith.tools import FragmentIndex, IdentityIndex, dbpathname
+from regolith import fsclient
+
+INDEXED_FIELDS = ("name",)
+"""Top-level document fields that get their own indexed column, in addition
+to ``_id``."""
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS collections (
+    db TEXT NOT NULL,
+    coll TEXT NOT NULL,
+    filetype TEXT NOT NULL,
+    ext TEXT NOT NULL,
+    PRIMARY KEY (db, coll)
+);
+CREATE TABLE IF NOT EXISTS documents (
+    db TEXT NOT NULL,
+    coll TEXT NOT NULL,
+    _id NOT NULL,
+    {fields},
+    doc TEXT NOT NULL,
+    PRIMARY KEY (db, coll, _id)
+);
+{indexes}
+""".format(
+    fields=",\n    ".join(f + " TEXT" for f in INDEXED_FIELDS),
+    indexes="\n".join(
+        "CREATE INDEX IF NOT EXISTS documents_{0} ON documents "
+        "(db, coll, {0});".format(f)
+        for f in INDEXED_FIELDS
+    ),
+)
+
+
+def _json_default(obj):
+    """Encodes dates and datetimes as objects tagged with their type, so
+    that they can be told apart from strings when they are decoded."""
+    if isinstance(obj, datetime.datetime):
+        return {"$datetime": obj.isoformat()}
+    elif isinstance(obj, datetime.date):
+        return {"$date": obj.isoformat()}
+    raise TypeError(
+        "Object of type {0} is not JSON serializable".format(
+            type(obj).__name__)
+    )
+
+
+def _json_object_hook(obj):
+    """Restores the dates and datetimes encoded by _json_default."""
+    if len(obj) == 1:
+        if "$datetime" in obj:
+            return datetime.datetime.fromisoformat(obj["$datetime"])
+        elif "$date" in obj:
+            return datetime.date.fromisoformat(obj["$date"])
+    return obj
+
+
+def _encode(doc):
+    return json.dumps(doc, sort_keys=True, default=_json_default)
+
+
+def _decode(text):
+    return json.loads(text, object_hook=_json_object_hook)
+
+
+def _row(dbname, collname, doc):
+    """Returns the column values for a document."""
+    fields = []
+    for f in INDEXED_FIELDS:
+        value = doc.get(f, None)
+        fields.append(value if isinstance(value, str) else None)
+    return [dbname, collname, doc["_id"]] + fields + [_encode(doc)]
+
+
+class SQLiteCollection(MutableMapping):
+    """A collection stored in SQLite, which maps document ids to documents.
+
+    Documents are only decoded when they are accessed, and are then kept so
+    that repeated lookups return the same object. Setting or deleting an item
+    is committed to the database immediately.
+
+    Parameters
+    ----------
+    conn : sqlite3.Connection
+        The connection to the database.
+    dbname : str
+        The name of the regolith database.
+    collname : str
+        The name of the collection.
+    """
+
+    def __init__(self, conn, dbname, collname):
+        self.conn = conn
+        self.dbname = dbname
+        self.collname = collname
+        self._docs = {}
+
+    def _query(self, sql, params=()):
+        return self.conn.execute(
+            sql + (" AND " if "WHERE" in sql else " WHERE ") + "db=? AND coll=?",
+            tuple(params) + (self.dbname, self.collname),
+        )
+
+    def _decode(self, _id, text):
+        if _id not in self._docs:
+            self._docs[_id] = _decode(text)
+        return self._docs[_id]
+
+    def __getitem__(self, key):
+        if key in self._docs:
+            return self._docs[key]
+        row = self._query("SELECT doc FROM documents WHERE _id=?",
+                          (key,)).fetchone()
+        if row is None:
+            raise KeyError(key)
+        return self._decode(key, row[0])
+
+    def __setitem__(self, key, value):
+        self.update_many({key: value})
+
+    def __delitem__(self, key):
+        with self.conn:
+            cur = self._query("DELETE FROM documents WHERE _id=?", (key,))
+        self._docs.pop(key, None)
+        if cur.rowcount == 0:
+            raise KeyError(key)
+
+    def __contains__(self, key):
+        if key in self._docs:
+            return True
+        row = self._query("SELECT 1 FROM documents WHERE _id=?",
+                          (key,)).fetchone()
+        return row is not None
+
+    def __iter__(self):
+        rows = self._query("SELECT _id FROM documents").fetchall()
+        return iter([row[0] for row in rows])
+
+    def __len__(self):
+        return self._query("SELECT COUNT(*) FROM documents").fetchone()[0]
+
+    def __repr__(self):
+        return "{0}({1!r}, {2!r})".format(
+            self.__class__.__name__, self.dbname, self.collname)
+
+    def __deepcopy__(self, memo):
+        return {key: deepcopy(value, memo) for key, value in self.items()}
+
+    def items(self):
+        """Returns a list of (id, document) pairs, fetched in one query."""
+        rows = self._query("SELECT _id, doc FROM documents").fetchall()
+        return [(_id, self._decode(_id, text)) for _id, text in rows]
+
+    def values(self):
+        """Returns a list of the documents, fetched in one query."""
+        return [doc for _, doc in self.items()]
+
+    def update_many(self, docs):
+        """Inserts or replaces many documents in one transaction.
+
+        Parameters
+        ----------
+        docs : dict
+            Maps document ids to documents.
+        """
+        rows = []
+        for key, doc in docs.items():
+            doc = dict(doc)
+            doc["_id"] = key
+            rows.append(_row(self.dbname, self.collname, doc))
+        sql = "INSERT OR REPLACE INTO documents (db, coll, _id, {0}doc) " \
+              "VALUES ({1})".format(
+                  "".join(f + ", " for f in INDEXED_FIELDS),
+                  ", ".join("?" * (len(INDEXED_FIELDS) + 4)))
+        with self.conn:
+            self.conn.executemany(sql, rows)
+        self._docs.update(docs)
+
+    def find_one(self, filter):
+        """Finds the first document matching filter, using the indexed
+        columns to narrow down the candidates."""
+        where = []
+        params = []
+        for f in ("_id",) + INDEXED_FIELDS:
+            value = filter.get(f, None)
+            if isinstance(value, (str, int)):
+                where.append(f + "=?")
+                params.append(value)
+        sql = "SELECT _id, doc FROM documents"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        for _id, text in self._query(sql, params).fetchall():
+            doc = self._decode(_id, text)
+            if all(key in doc and doc[key] == value
+                   for key, value in filter.items()):
+                return doc
+
+
+class SQLiteClient:
+    """A client backed by a local SQLite database.
+
+    Attributes
+    ----------
+    rc : RunControl
+        The RunControl. The database file is given by its 'sqlitepath'
+        attribute.
+
+    conn : sqlite3.Connection
+        The connection to the database file.
+    """
+
+    def __init__(self, rc):
+        self.rc = rc
+        self.conn = None
+        self.dbs = defaultdict(dict)
+        self.chained_db = dict()
+        self._identity_indexes = {}
+        self._fragment_indexes = {}
+        self.closed = True
+        self.open()
+
+    def is_alive(self):
+        """Returns whether or not the client is open."""
+        return self.conn is not None and not self.closed
+
+    def open(self):
+        """Opens the database file, creating it if needed."""
+        if self.is_alive():
+            return
+        dbdir = os.path.dirname(self.rc.sqlitepath)
+        if dbdir:
+            os.makedirs(dbdir, exist_ok=True)
+        self.conn = sqlite3.connect(self.rc.sqlitepath)
+        self.conn.executescript(SCHEMA)
+        self.closed = False
+
+    def _collections(self, dbname):
+        """Returns (collection name, file type, extension) rows for a
+        database."""
+        return self.conn.execute(
+            "SELECT coll, filetype, ext FROM collections WHERE db=?",
+            (dbname,)).fetchall()
+
+    def _register(self, dbname, collname, filetype="yaml", ext=".yaml"):
+        with self.conn:
+            self.conn.execute(
+                "INSERT OR IGNORE INTO collections VALUES (?, ?, ?, ?)",
+                (dbname, collname, filetype, ext))
+
+    def _collection(self, dbname, collname):
+        colls = self.dbs[dbname]
+        if not isinstance(colls.get(collname), SQLiteCollection):
+            self._register(dbname, collname)
+            colls[collname] = SQLiteCollection(self.conn, dbname, collname)
+        return colls[collname]
+
+    def load_database(self, db: dict):
+        """Registers the collections of a database in the 'dbs' attribute.
+        The documents themselves are only read from the database file when
+        they are accessed.
+
+        Parameters
+        ----------
+        db : dict
+            The dictionary of data base information, such as 'name'.
+        """
+        whitelist = db.get("whitelist", [])
+        for collname, _, _ in self._collections(db["name"]):
+            if len(whitelist) == 0 or collname in whitelist:
+                self.dbs[db["name"]][collname] = SQLiteCollection(
+                    self.conn, db["name"], collname)
+
+    def import_database(self, db: dict):
+        """Import the database from filesystem to the SQLite backend. Each
+        collection is written in a single transaction.
+
+        Parameters
+        ----------
+        db : dict
+            The dictionary of data base information, such as 'name'.
+        """
+        dbpath = dbpathname(db, self.rc)
+        blacklist = db.get("blacklist", [])
+        for pattern, filetype, loader in [("*.json", "json", fsclient.load_json),
+                                          ("*.y*ml", "yaml", fsclient.load_yaml)]:
+            for f in iglob(os.path.join(dbpath, pattern)):
+                if f in blacklist or os.path.basename(f) in blacklist:
+                    continue
+                base, ext = os.path.splitext(os.path.basename(f))
+                print("importing " + f + "...", file=sys.stderr)
+                docs = loader(f)
+                with self.conn:
+                    self.conn.execute(
+                        "INSERT OR REPLACE INTO collections "
+                        "VALUES (?, ?, ?, ?)", (db["name"], base, filetype, ext))
+                SQLiteCollection(self.conn, db["name"], base).update_many(docs)
+        return
+
+    def dump_database(self, db):
+        """Exports a database to the filesystem, writing each collection in
+        the file format it was imported from."""
+        dbpath = dbpathname(db, self.rc)
+        os.makedirs(dbpath, exist_ok=True)
+        to_add = []
+        for collname, filetype, ext in self._collections(db["name"]):
+            print("dumping " + collname + "...", file=sys.stderr)
+            docs = dict(SQLiteCollection(self.conn, db["name"], collname).items())
+            filename = collname + ext
+            if filetype == "json":
+                fsclient.dump_json(os.path.join(dbpath, filename), docs)
+            else:
+                fsclient.dump_yaml(os.path.join(dbpath, filename), docs)
+            to_add.append(os.path.join(db["path"], filename))
+        return to_add
+
+    def close(self):
+        """Closes the database connection."""
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
+        self.closed = True
+
+    def keys(self):
+        return self.dbs.keys()
+
+    def __getitem__(self, key):
+        return self.dbs[key]
+
+    def collection_names(self, dbname, include_system_collections=True):
+        """Returns the collection names for a database."""
+        return set(row[0] for row in self._collections(dbname))
+
+    def all_documents(self, collname, copy=True, cow=False):
+        """Returns an iterable over all documents in a collection. If copy
+        is True, the documents are deep copies, or copy-on-write views if cow
+        is also True, so that changing them leaves the database untouched."""
+        if copy and cow:
+            return [copy_on_write(doc)
+                    for doc in self.chained_db.get(collname, {}).values()]
+        elif copy:
+            return deepcopy(self.chained_db.get(collname, {})).values()
+        return self.chained_db.get(collname, {}).values()
+
+    def identity_index(self, collname):
+        """Returns an ``IdentityIndex`` of the documents in a collection by
+        their ``_id``, ``name`` and ``aka``, ignoring case. It is built when
+        it is first needed and is kept until the collection is written to."""
+        if collname not in self._identity_indexes:
+            self._identity_indexes[collname] = IdentityIndex(
+                self.all_documents(collname, copy=False),
+                case_sensitive=False)
+        return self._identity_indexes[collname]
+
+    def fragment_index(self, collname):
+        """Returns a ``FragmentIndex`` of the documents in a collection on the
+        fields listed for it in the ``fragment_indexes`` run control value.
+        It is built when it is first needed and is kept until the collection
+        is written to."""
+        if collname not in self._fragment_indexes:
+            fields = getattr(self.rc, "fragment_indexes", {}).get(collname, ())
+            self._fragment_indexes[collname] = FragmentIndex(
+                self.all_documents(collname, copy=False), fields)
+        return self._fragment_indexes[collname]
+
+    def insert_one(self, dbname, collname, doc):
+        """Inserts one document to a database/collection."""
+        self._collection(dbname, collname)[doc["_id"]] = doc
+        self._identity_indexes.pop(collname, None)
+        self._fragment_indexes.pop(collname, None)
+        invalidate(self.chained_db, collname)
+
+    def insert_many(self, dbname, collname, docs):
+        """Inserts many documents into a database/collection."""
+        self._collection(dbname, collname).update_many(
+            {doc["_id"]: doc for doc in docs})
+        self._identity_indexes.pop(collname, None)
+        self._fragment_indexes.pop(collname, None)
+        invalidate(self.chained_db, collname)
+
+    def delete_one(self, dbname, collname, doc):
+        """Removes a single document from a collection"""
+        del self._collection(dbname, collname)[doc["_id"]]
+        self._identity_indexes.pop(collname, None)
+        self._fragment_indexes.pop(collname, None)
+        invalidate(self.chained_db, collname)
+
+    def find_one(self, dbname, collname, filter):
+        """Finds the first document matching filter."""
+        return self._collection(dbname, collname).find_one(filter)
+
+    def update_one(self, dbname, collname, filter, update, **kwargs):
+        """Updates one document."""
+        doc = self.find_one(dbname, collname, filter)
+        newdoc = dict(filter if doc is None else doc)
+        newdoc.update(update)
+        self._collection(dbname, collname)[newdoc["_id"]] = newdoc
+        self._identity_indexes.pop(collname, None)
+        self._fragment_indexes.pop(collname, None)
+        invalidate(self.chained_db, collname)
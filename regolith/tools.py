@@ -6,14 +6,16 @@ import platform
 import re
 import sys
 import time
+from collections.abc import Mapping
 from copy import deepcopy, copy
+from functools import lru_cache
 from calendar import monthrange
 from copy import deepcopy
 from datetime import datetime, date, timedelta
 from dateutil import parser as date_parser
 from dateutil.relativedelta import relativedelta
 
-from regolith.chained_db import ChainDB
+from regolith.chained_db import ChainDB, Singleton, copy_on_write
 from regolith.dates import month_to_int, date_to_float, get_dates, last_day, is_current
 from regolith.sorters import doc_date_key, id_key, ene_date_key, date_key
 from regolith.chained_db import ChainDB
@@ -71,10 +73,12 @@ def fallback(cond, backup):
     return dec
 
 
-def all_docs_from_collection(client, collname, copy=True):
+def all_docs_from_collection(client, collname, copy=True, cow=True):
     """Yield all entries in for all collections of a given name in a given
-    database. """
-    yield from client.all_documents(collname, copy=copy)
+    database. By default the entries are copy-on-write views, so they may be
+    changed without touching the database and are only copied where they
+    are changed."""
+    yield from client.all_documents(collname, copy=copy, cow=cow)
 
 
 SHORT_MONTH_NAMES = (
@@ -371,23 +375,14 @@ def filter_facilities(people, begin_period, type, verbose=False):
 def filter_patents(patentscoll, people, target, since=None, before=None):
     patents = []
     allowed_statuses = ["active", "pending"]
+    people_index = IdentityIndex(people, case_sensitive=False)
     for i in patentscoll:
         if i.get("status") in allowed_statuses and i.get("type") in "patent":
             inventors = [
-                fuzzy_retrieval(
-                    people,
-                    ["aka", "name", "_id"],
-                    inv,
-                    case_sensitive=False,
-                )
+                people_index.get(inv)
                 for inv in i['inventors']
             ]
-            person = fuzzy_retrieval(
-                people,
-                ["aka", "name", "_id"],
-                target,
-                case_sensitive=False,
-            )
+            person = people_index.get(target)
             if person in inventors:
                 if i.get('end_year'):
                     end_year = i.get('end_year')
@@ -429,23 +424,14 @@ def filter_patents(patentscoll, people, target, since=None, before=None):
 def filter_licenses(patentscoll, people, target, since=None, before=None):
     licenses = []
     allowed_statuses = ["active", "pending"]
+    people_index = IdentityIndex(people, case_sensitive=False)
     for i in patentscoll:
         if i.get("status") in allowed_statuses and i.get("type") in "license":
             inventors = [
-                fuzzy_retrieval(
-                    people,
-                    ["aka", "name", "_id"],
-                    inv,
-                    case_sensitive=False,
-                )
+                people_index.get(inv)
                 for inv in i['inventors']
             ]
-            person = fuzzy_retrieval(
-                people,
-                ["aka", "name", "_id"],
-                target,
-                case_sensitive=False,
-            )
+            person = people_index.get(target)
             if person in inventors:
                 if i.get('end_year'):
                     end_year = i.get('end_year')
@@ -562,6 +548,8 @@ def filter_presentations(people, presentations, institutions, target, types=["al
 
     '''
     presentations = deepcopy(presentations)
+    people_index = IdentityIndex(people, case_sensitive=False)
+    institutions_index = IdentityIndex(institutions, case_sensitive=False)
 
     firstclean = list()
     secondclean = list()
@@ -576,12 +564,7 @@ def filter_presentations(people, presentations, institutions, target, types=["al
         if isinstance(pauthors, str):
             pauthors = [pauthors]
         authors = [
-            fuzzy_retrieval(
-                people,
-                ["aka", "name", "_id"],
-                author,
-                case_sensitive=False,
-            )
+            people_index.get(author)
             for author in pauthors
         ]
         authorids = [
@@ -626,19 +609,8 @@ def filter_presentations(people, presentations, institutions, target, types=["al
             pauthors = [pauthors]
         pres["authors"] = [
             author
-            if fuzzy_retrieval(
-                people,
-                ["aka", "name", "_id"],
-                author,
-                case_sensitive=False,
-            )
-               is None
-            else fuzzy_retrieval(
-                people,
-                ["aka", "name", "_id"],
-                author,
-                case_sensitive=False,
-            )["name"]
+            if people_index.get(author) is None
+            else people_index.get(author)["name"]
             for author in pauthors
         ]
         authorlist = ", ".join(pres["authors"])
@@ -655,11 +627,8 @@ def filter_presentations(people, presentations, institutions, target, types=["al
             )
         if "institution" in pres:
             try:
-                pres["institution"] = fuzzy_retrieval(
-                    institutions,
-                    ["aka", "name", "_id"],
-                    pres["institution"],
-                    case_sensitive=False,
+                pres["institution"] = institutions_index.get(
+                    pres["institution"]
                 )
                 if pres["institution"] is None:
                     print(
@@ -869,6 +838,73 @@ def make_bibtex_file(pubs, pid, person_dir="."):
     return fname
 
 
+@lru_cache(maxsize=256)
+def compile_path(address):
+    """Compiles an address into a function that gets the value there in a
+    document, walking the document without copying it.
+
+    Parameters
+    ----------
+    address: str or tuple
+        The keys and list indices to follow, either as a tuple or as a
+        dotted path string whose numeric parts index lists.
+
+    Returns
+    -------
+    callable:
+        A function of a document and an optional default, which returns the
+        value at the address or the default if there is nothing there.
+
+    Examples
+    --------
+    >>> compile_path("employment.0.organization")(person, default="")
+    """
+    if isinstance(address, str):
+        address = tuple(int(k) if k.isdigit() else k
+                        for k in address.split("."))
+
+    def get(doc, default=None):
+        value = doc
+        for key in address:
+            try:
+                value = value[key]
+            except (KeyError, IndexError, TypeError):
+                return default
+        return value
+
+    return get
+
+
+class ValueIndex(object):
+    """A hash index from the values at an address in documents to the first
+    of the documents with that value. Documents without a value there, or
+    whose value is not hashable, are not indexed.
+
+    Parameters
+    ----------
+    documents : iterable
+        The documents.
+    address : str or tuple
+        The address of the values, as for ``compile_path``.
+    """
+
+    def __init__(self, documents, address):
+        get = compile_path(address)
+        self._docs = {}
+        for doc in documents:
+            value = get(doc, Singleton)
+            if value is not Singleton and _identity_key(value, True) \
+                    is not None:
+                self._docs.setdefault(value, doc)
+
+    def get(self, value, default=None):
+        """Returns the document with the value, or default if there is
+        none."""
+        if _identity_key(value, True) is None:
+            return default
+        return self._docs.get(value, default)
+
+
 def document_by_value(documents, address, value):
     """Get a specific document by one of its values
 
@@ -885,15 +921,70 @@ def document_by_value(documents, address, value):
     -------
     dict:
         The first document which matches the request
+
+    This scans the documents. To look up many values in the same documents,
+    build a ``ValueIndex`` of them once instead.
     """
     if isinstance(address, str):
         address = (address,)
-    for g_doc in documents:
-        doc = deepcopy(g_doc)
-        for add in address:
-            doc = doc[add]
-        if doc == value:
-            return g_doc
+    get = compile_path(address)
+    for doc in documents:
+        if get(doc, Singleton) == value:
+            return doc
+
+
+IDENTITY_FIELDS = ("_id", "name", "aka")
+"""The fields that a person, contact or institution may be referred to by."""
+
+
+def _identity_key(value, case_sensitive):
+    """Returns the key a value is indexed by, or None if it can't be."""
+    if not case_sensitive:
+        return value.casefold() if isinstance(value, str) else None
+    try:
+        hash(value)
+    except TypeError:
+        return None
+    return value
+
+
+class IdentityIndex(object):
+    """A hash index from the values of some fields of documents to the first
+    of the documents with that value, so that the document ``fuzzy_retrieval``
+    would find can be looked up without a scan. Fields whose values are lists
+    are indexed by each element.
+
+    Parameters
+    ----------
+    documents : iterable
+        The documents.
+    sources : iterable, optional
+        The fields to index.
+    case_sensitive : bool, optional
+        When False, strings are casefolded and other values are not indexed.
+    """
+
+    def __init__(self, documents, sources=IDENTITY_FIELDS,
+                 case_sensitive=True):
+        self.case_sensitive = case_sensitive
+        self._docs = {}
+        for doc in documents:
+            for k in sources:
+                values = doc.get(k, [])
+                if not isinstance(values, list):
+                    values = [values]
+                for v in values:
+                    key = _identity_key(v, case_sensitive)
+                    if key is not None:
+                        self._docs.setdefault(key, doc)
+
+    def get(self, value, default=None):
+        """Returns the document with the value, or default if there is
+        none."""
+        key = _identity_key(value, self.case_sensitive)
+        if key is None:
+            return default
+        return self._docs.get(key, default)
 
 
 def fuzzy_retrieval(documents, sources, value, case_sensitive=True):
@@ -923,25 +1014,48 @@ def fuzzy_retrieval(documents, sources, value, case_sensitive=True):
     This would get the person entry for which either the alias or the name was
     ``pi_name``.
 
+    This scans the documents. To look up many values in the same documents,
+    build an ``IdentityIndex`` of them once instead.
+
     """
+    key = _identity_key(value, case_sensitive)
+    if key is None:
+        return None
     for doc in documents:
-        returns = []
         for k in sources:
             ret = doc.get(k, [])
             if not isinstance(ret, list):
                 ret = [ret]
-            returns.extend(ret)
-        if not case_sensitive:
-            returns = [reti.lower() for reti in returns if
-                       isinstance(reti, str)]
-            if isinstance(value, str):
-                if value.lower() in frozenset(returns):
-                    return doc
-        else:
-            if value in frozenset(returns):
+            if any(_identity_key(reti, case_sensitive) == key
+                   for reti in ret):
                 return doc
 
 
+def identity_retrieval(client, collname, value):
+    """Retrieve the document of a collection whose ``_id``, ``name`` or
+    ``aka`` is value, ignoring case, through the identity index the client
+    keeps for the collection.
+
+    Parameters
+    ----------
+    client : client
+        The database client.
+    collname : str
+        The name of the collection.
+    value : str
+        The value to look for.
+
+    Returns
+    -------
+    dict or None:
+        A copy-on-write view of the document, or None if there is none.
+    """
+    doc = client.identity_index(collname).get(value)
+    if doc is None:
+        return None
+    return copy_on_write(doc)
+
+
 def number_suffix(number):
     """returns the suffix that adjectivises a number (st, nd, rd, th)
 
@@ -1035,17 +1149,108 @@ def merge_collections(a, b, target_id):
     bdict = {}
     for k in b:
         bdict[k.get("_id")] = k
-    b_for_a = {}
-    for k in adict:
-        for kk, v in bdict.items():
-            if v.get(target_id, "") == k:
-                b_for_a[k] = kk
     chained = {}
-    for k, v in b_for_a.items():
-        chained[k] = ChainDB(adict[k], bdict[v])
+    # the last document in b that refers to a document in a is the one kept
+    for merged in join_collections(adict.values(), bdict.values(),
+                                   right_on=target_id):
+        chained[merged.maps[0].get("_id")] = merged
     return list(chained.values())
 
 
+JOIN_TYPES = frozenset(["inner", "left", "union"])
+
+
+def join_collections(left, right, left_on="_id", right_on="_id",
+                     how="inner"):
+    """Joins two collections on the values at an address in the documents of
+    each. The smaller collection is hashed by its values, so that the join
+    takes a single pass over each collection.
+
+    Parameters
+    ----------
+    left: iterable
+        The inferior collection, whose values are lost for shared keys
+    right: iterable
+        The superior collection, whose values are kept for shared keys
+    left_on: str or tuple, optional
+        The address of the values in left documents, as for ``compile_path``.
+        Defaults to "_id"
+    right_on: str or tuple, optional
+        The address of the values in right documents. Defaults to "_id"
+    how: str, optional
+        "inner" to only yield documents that are joined, "left" to also yield
+        the left documents that are not joined, or "union" to also yield the
+        right documents that are not joined. Defaults to "inner"
+
+    Yields
+    ------
+    ChainDB:
+        A ChainDB of a left document and a right document with the same
+        value, or of just one of them when it is not joined. Documents are
+        yielded in the order of left, with each left document joined to
+        every right document with its value in the order of right, followed
+        by the right documents that are not joined for a union. Documents
+        without a hashable value at their address are never joined.
+
+    Examples
+    --------
+    >>> join_collections(proposals, grants, right_on="proposal_id")
+
+    This would join the proposals to the grants that were awarded for them.
+
+    >>> join_collections(presentations, institutions, left_on="institution", how="left")
+
+    This would join the presentations to their institutions, keeping the
+    presentations at unknown institutions.
+    """
+    if how not in JOIN_TYPES:
+        raise ValueError("how must be one of {}, not {!r}".format(
+            sorted(JOIN_TYPES), how))
+    left = list(left)
+    right = list(right)
+    left_key = compile_path(left_on)
+    right_key = compile_path(right_on)
+    matches = [[] for _ in left]
+    if len(right) <= len(left):
+        positions = _hash_positions(right, right_key)
+        for i, doc in enumerate(left):
+            matches[i] = positions.get(_join_key(left_key, doc), [])
+    else:
+        positions = _hash_positions(left, left_key)
+        for j, doc in enumerate(right):
+            for i in positions.get(_join_key(right_key, doc), ()):
+                matches[i].append(j)
+    joined = set()
+    for i, doc in enumerate(left):
+        for j in matches[i]:
+            joined.add(j)
+            yield ChainDB(doc, right[j])
+        if not matches[i] and how != "inner":
+            yield ChainDB(doc)
+    if how == "union":
+        for j, doc in enumerate(right):
+            if j not in joined:
+                yield ChainDB(doc)
+
+
+def _join_key(get, doc):
+    """Returns the value a document is joined on, or None if it can't be."""
+    value = get(doc, Singleton)
+    if value is Singleton:
+        return None
+    return _identity_key(value, True)
+
+
+def _hash_positions(docs, get):
+    """Maps the values documents are joined on to their positions."""
+    positions = {}
+    for i, doc in enumerate(docs):
+        key = _join_key(get, doc)
+        if key is not None:
+            positions.setdefault(key, []).append(i)
+    return positions
+
+
 def update_schemas(default_schema, user_schema):
     """
     Merging the user schema into the default schema recursively and return the
@@ -1079,20 +1284,10 @@ def update_schemas(default_schema, user_schema):
 
 def get_person(person_id, rc):
     """Get the person's name."""
-    person_found = fuzzy_retrieval(
-        all_docs_from_collection(rc.client, "people"),
-        ["name", "aka", "_id"],
-        person_id,
-        case_sensitive=False
-    )
+    person_found = identity_retrieval(rc.client, "people", person_id)
     if person_found:
         return person_found
-    person_found = fuzzy_retrieval(
-        all_docs_from_collection(rc.client, "contacts"),
-        ["name", "aka", "_id"],
-        person_id,
-        case_sensitive=False
-    )
+    person_found = identity_retrieval(rc.client, "contacts", person_id)
     if person_found:
         return person_found
     print("WARNING: {} missing from people and contacts. Check aka.".format(person_id))
@@ -1196,6 +1391,96 @@ def group_member_ids(ppl_coll, grpname):
     return grpmembers
 
 
+def _trigrams(s):
+    """Returns the set of the substrings of length 3 of a string."""
+    return {s[i:i + 3] for i in range(len(s) - 2)}
+
+
+class TrigramIndex(object):
+    """A trigram index of the strings in a field of a list of documents,
+    which narrows down the documents a substring may appear in. Fields whose
+    values are lists are indexed by each element.
+
+    Parameters
+    ----------
+    documents : list
+        The documents.
+    field : str
+        The field to index.
+    case_sensitive : bool, optional
+        When False, the strings are indexed in lower case.
+    """
+
+    def __init__(self, documents, field, case_sensitive=False):
+        self.field = field
+        self.case_sensitive = case_sensitive
+        self._positions = {}
+        # documents with values that are not strings, and so not indexed
+        self._unindexed = set()
+        for i, doc in enumerate(documents):
+            values = doc.get(field, [])
+            if not isinstance(values, list):
+                values = [values]
+            for value in values:
+                if not isinstance(value, str):
+                    self._unindexed.add(i)
+                    continue
+                if not case_sensitive:
+                    value = value.lower()
+                for gram in _trigrams(value):
+                    self._positions.setdefault(gram, set()).add(i)
+
+    def candidates(self, fragment):
+        """Returns the set of the positions of the documents whose field may
+        contain the fragment, or None if the fragment is too short to narrow
+        them down."""
+        if not isinstance(fragment, str) or len(fragment) < 3:
+            return None
+        if not self.case_sensitive:
+            fragment = fragment.lower()
+        grams = sorted(_trigrams(fragment),
+                       key=lambda g: len(self._positions.get(g, ())))
+        found = set(self._positions.get(grams[0], ()))
+        for gram in grams[1:]:
+            if not found:
+                break
+            found &= self._positions.get(gram, set())
+        if self.case_sensitive:
+            found |= self._unindexed
+        return found
+
+
+class FragmentIndex(object):
+    """Trigram indexes on some fields of a list of documents, ignoring case,
+    which narrow down the documents that a fragment may appear in.
+
+    Parameters
+    ----------
+    documents : iterable
+        The documents.
+    fields : iterable
+        The fields to index.
+    """
+
+    def __init__(self, documents, fields):
+        self.documents = list(documents)
+        self._indexes = {field: TrigramIndex(self.documents, field)
+                         for field in fields}
+
+    def candidates(self, fields, fragment):
+        """Returns the documents, in order, whose fields may contain the
+        fragment when case is ignored. All of the documents are returned if
+        one of the fields is not indexed or the fragment is too short."""
+        found = set()
+        for field in fields:
+            index = self._indexes.get(field, None)
+            positions = None if index is None else index.candidates(fragment)
+            if positions is None:
+                return self.documents
+            found |= positions
+        return [self.documents[i] for i in sorted(found)]
+
+
 def fragment_retrieval(coll, fields, fragment, case_sensitive = False):
     """Retrieves a list of all documents from the collection where the fragment
     appears in any one of the given fields
@@ -1224,34 +1509,42 @@ def fragment_retrieval(coll, fields, fragment, case_sensitive = False):
     the substring ``pi_name``.
 
     """
-
+    if not case_sensitive:
+        if not isinstance(fragment, str):
+            return []
+        fragment = fragment.lower()
     ret_list = []
     for doc in coll:
-        returns = []
         for k in fields:
             ret = doc.get(k, [])
             if not isinstance(ret, list):
                 ret = [ret]
-            returns.extend(ret)
-        if not case_sensitive:
-            returns = [reti.lower() for reti in returns if
-                       isinstance(reti, str)]
-            if isinstance(fragment, str):
-                for item in frozenset(returns):
-                    if fragment.lower() in item:
-                        ret_list.append(doc)
-                        break
-        else:
-            for item in frozenset(returns):
-                if fragment in item:
-                    ret_list.append(doc)
-                    break
+            if case_sensitive:
+                found = any(fragment in item for item in ret)
+            else:
+                found = any(fragment in item.lower() for item in ret
+                            if isinstance(item, str))
+            if found:
+                ret_list.append(doc)
+                break
     return ret_list
 
 
 def get_id_from_name(coll, name):
-    person = fuzzy_retrieval(coll,["name", "aka", "_id"], name,
-                             case_sensitive=False)
+    """Returns the ``_id`` of the person whose ``name``, ``aka`` or ``_id`` is
+    name, ignoring case, or None if there is none.
+
+    Parameters
+    ----------
+    coll : IdentityIndex or iterable
+        An identity index that ignores case, such as the one a client keeps
+        for the people collection, or the documents to index.
+    name : str
+        The name to look for.
+    """
+    if not isinstance(coll, IdentityIndex):
+        coll = IdentityIndex(coll, case_sensitive=False)
+    person = coll.get(name)
     if person:
         return person["_id"]
     else:
@@ -1326,6 +1619,160 @@ def is_fully_appointed(person, begin_date, end_date):
                 print("WARNING: appointment gap for {} on {}".format(person.get('_id'), str(day)))
     return status
 
+def _path_values(value, keys):
+    """Yields the values at a path of keys into a document. Lists along the
+    path are indexed by position if the key is a number and are searched
+    through otherwise, and lists at the end of the path are flattened."""
+    if not keys:
+        if isinstance(value, list):
+            yield from value
+        else:
+            yield value
+        return
+    key, rest = keys[0], keys[1:]
+    if isinstance(value, Mapping):
+        if key in value:
+            yield from _path_values(value[key], rest)
+    elif isinstance(value, list):
+        if key.isdigit():
+            if int(key) < len(value):
+                yield from _path_values(value[int(key)], rest)
+        else:
+            for item in value:
+                if isinstance(item, Mapping):
+                    yield from _path_values(item, keys)
+
+
+def path_values(doc, path):
+    """Returns the list of values at a dotted path in a document, such as
+    ``employment.organization`` or ``employment.0.organization``. A key that
+    is in the document with the dots in it is used as it is.
+
+    Parameters
+    ----------
+    doc: dict
+        The document
+    path: str
+        The dotted path
+
+    Returns
+    -------
+    list:
+        The values at the path, with lists flattened into their elements
+    """
+    if path in doc:
+        return list(_path_values(doc[path], []))
+    return list(_path_values(doc, path.split(".")))
+
+
+def substring(path, fragment, case_sensitive=False):
+    """Makes a predicate for whether the fragment is in a string at the
+    dotted path of a document."""
+    if not case_sensitive:
+        if not isinstance(fragment, str):
+            return lambda doc: False
+        fragment = fragment.lower()
+
+    def predicate(doc):
+        for value in path_values(doc, path):
+            if not isinstance(value, str):
+                continue
+            if fragment in (value if case_sensitive else value.lower()):
+                return True
+        return False
+
+    return predicate
+
+
+def equals(path, value):
+    """Makes a predicate for whether a value at the dotted path of a document
+    is equal to value."""
+    return lambda doc: any(v == value for v in path_values(doc, path))
+
+
+def date_range(since=None, before=None, date_field_prefix=None):
+    """Makes a predicate for whether the dates of a document, as given by
+    ``get_dates``, overlap the interval from since to before. Either end of
+    the interval may be None to leave it open. A document without an end
+    date is taken to be ongoing, and documents without dates never match."""
+
+    def predicate(doc):
+        dates = get_dates(doc, date_field_prefix=date_field_prefix)
+        begin = dates.get("begin_date") or dates.get("date")
+        end = dates.get("end_date") or dates.get("date")
+        if begin is None and end is None:
+            return False
+        return (since is None or end is None or end >= since) \
+            and (before is None or begin is None or begin <= before)
+
+    return predicate
+
+
+def compile_query(predicates):
+    """Combines predicates into a single function of a document that is True
+    when all of them are."""
+    predicates = tuple(predicates)
+
+    def query(doc):
+        for predicate in predicates:
+            if not predicate(doc):
+                return False
+        return True
+
+    return query
+
+
+def select(collection, predicates):
+    """Yields the documents of a collection for which all of the predicates
+    are True, in a single pass."""
+    query = compile_query(predicates)
+    for doc in collection:
+        if query(doc):
+            yield doc
+
+
+def collection_fragment_retrieval(client, collname, fields, fragment,
+                                  case_sensitive=False):
+    """Retrieves the documents of a collection where the fragment appears in
+    any one of the given fields, as ``fragment_retrieval`` does. Searches
+    that ignore case only check the documents that the fragment index the
+    client keeps for the collection allows for. The indexed fields are set
+    with the ``fragment_indexes`` run control value.
+
+    Parameters
+    ----------
+    client : client
+        The database client.
+    collname : str
+        The name of the collection.
+    fields: iterable
+        The fields of each document to check for the fragment
+    fragment:
+       The value to compare against to find the documents of interest
+    case_sensitive: Bool
+        When true will match case (Default = False)
+
+    Returns
+    -------
+    list:
+        Copy-on-write views of the documents.
+    """
+    index = client.fragment_index(collname)
+    if case_sensitive:
+        docs = index.documents
+    else:
+        docs = index.candidates(fields, fragment)
+    return [copy_on_write(doc)
+            for doc in fragment_retrieval(docs, fields, fragment,
+                                          case_sensitive)]
+
+
+def _kv_pairs(arguments):
+    if len(arguments) % 2 != 0:
+        raise RuntimeError("Error: Number of keys and values do not match")
+    return list(zip(arguments[::2], arguments[1::2]))
+
+
 def key_value_pair_filter(collection, arguments):
     """Retrieves a list of all documents from the collection where the fragment
         appears in any one of the given fields
@@ -1335,7 +1782,8 @@ def key_value_pair_filter(collection, arguments):
         collection: generator
             The collection containing the documents
         arguments: list
-            The name of the fields to look for and their accompanying substring
+            The name of the fields to look for and their accompanying substring.
+            The names may be dotted paths into the documents.
 
         Returns
         -------
@@ -1350,13 +1798,20 @@ def key_value_pair_filter(collection, arguments):
         and whose position is professor and return them
 
         """
+    pairs = _kv_pairs(arguments)
+    return list(select(collection, [substring(key, value)
+                                    for key, value in pairs]))
 
-    if len(arguments) % 2 != 0:
-        raise RuntimeError("Error: Number of keys and values do not match")
-    elements = collection
-    for i in range(0, len(arguments) - 1, 2):
-        elements = fragment_retrieval(elements, [arguments[i]], arguments[i + 1])
-    return elements
+
+def _collection_lines(collection, keys=None):
+    if not keys:
+        keys = ['_id']
+    if '_id' not in keys:
+        keys = ['_id'] + list(keys)
+    for doc in collection:
+        yield "".join(doc.get(key) + '    ' if key == '_id'
+                      else '{}: {}    '.format(key, doc.get(key))
+                      for key in keys) + '\n'
 
 
 def collection_str(collection, keys=None):
@@ -1375,19 +1830,7 @@ def collection_str(collection, keys=None):
         str:
             A str of all the values
     """
-    if not keys:
-        keys = ['_id']
-    if '_id' not in keys:
-        keys.insert(0, '_id')
-    output = ""
-    for doc in collection:
-        for key in keys:
-            if key == '_id':
-                output += (doc.get(key) + '    ')
-            else:
-                output += ('{}: {}    '.format(key, doc.get(key)))
-        output += '\n'
-    return output
+    return "".join(_collection_lines(collection, keys))
 
 
 def search_collection(collection, arguments, keys=None):
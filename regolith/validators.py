@@ -15,6 +15,11 @@ def is_int(x):
     return isinstance(x, int)
 
 
+def is_number(x):
+    """Tests if something is a number"""
+    return isinstance(x, (int, float)) and not isinstance(x, bool)
+
+
 def always_true(x):
     """Returns True"""
     return True
@@ -108,6 +113,19 @@ def ensure_email(email):
 DEFAULT_VALIDATORS = {
     "backend": (is_string, ensure_string),
     "builddir": (is_string, ensure_string),
+    "load_workers": (is_int, int),
+    "dbcache": (is_bool, to_bool),
+    "lazy_load": (is_bool, to_bool),
+    "fast_load": (is_bool, to_bool),
+    "indexed_json": (is_bool, to_bool),
+    "merged_snapshots": (is_bool, to_bool),
+    "memoize_chained": (is_bool, to_bool),
+    "offline": (is_bool, to_bool),
+    "pull_ttl": (is_number, float),
+    "mongo_batch_size": (is_int, int),
+    "mongo_pool_size": (is_int, int),
+    "mongo_timeout": (is_number, float),
+    "sparse_checkout": (is_bool, to_bool),
     "databases": (always_false, ensure_databases),
     "stores": (always_false, ensure_stores),
     "email": (always_false, ensure_email),
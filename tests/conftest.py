@@ -2,6 +2,7 @@
 All rights reserved."""
 import json
 import os
+import subprocess as sp
 import tempfile
 from copy import deepcopy
 
@@ -10,7 +11,7 @@ from pymongo import MongoClient
 from xonsh.lib import subprocess
 from xonsh.lib.os import rmtree
 
-from regolith.fsclient import dump_yaml
+from regolith.fsclient import dump_json, dump_yaml
 from regolith.schemas import EXEMPLARS
 
 OUTPUT_FAKE_DB = False  # always turn it to false after you used it
@@ -188,3 +189,44 @@ def make_bad_db():
     yield repo
     os.chdir(cwd)
     rmtree(repo)
+
+
+@pytest.fixture
+def fs_db(tmpdir):
+    """Writes the exemplars into a database directory, as JSON for the
+    citations and YAML for everything else."""
+    dbpath = os.path.join(str(tmpdir), "db")
+    os.mkdir(dbpath)
+    for coll, example in deepcopy(EXEMPLARS).items():
+        if isinstance(example, list):
+            d = {dd["_id"]: dd for dd in example}
+        else:
+            d = {example["_id"]: example}
+        if coll == "citations":
+            dump_json(os.path.join(dbpath, coll + ".json"), d)
+        else:
+            dump_yaml(os.path.join(dbpath, coll + ".yaml"), d)
+    db = {
+        "name": "test",
+        "url": str(tmpdir),
+        "path": "db",
+        "local": True,
+        "whitelist": [],
+        "blacklist": [],
+    }
+    return db
+
+
+@pytest.fixture
+def git_db(fs_db, tmpdir):
+    """Commits the filesystem database to a git repo and returns a database
+    whose url is a bare clone of that repo."""
+    repo = fs_db["url"]
+    remote = os.path.join(str(tmpdir), "remote.git")
+    git = ["git", "-c", "user.name=regolith", "-c", "user.email=r@example.com"]
+    sp.check_call(["git", "init", "-q", "-b", "master", repo])
+    sp.check_call(git + ["add", "db"], cwd=repo)
+    sp.check_call(git + ["commit", "-q", "-m", "initial"], cwd=repo)
+    sp.check_call(["git", "clone", "-q", "--bare", repo, remote])
+    db = dict(fs_db, url=remote, local=False)
+    return db
@@ -1,4 +1,17 @@
-from regolith.chained_db import ChainDB
+import json
+from copy import deepcopy
+
+import pytest
+
+from regolith.chained_db import (
+    ChainDB,
+    CopyOnWriteDict,
+    MergedCollections,
+    _convert_to_dict,
+    copy_on_write,
+    invalidate,
+    merge_maps,
+)
 
 
 def test_dddi():
@@ -156,3 +169,164 @@ def test_dicts_in_lists_mutation():
     extend_list = z["a"]["b"]
     extend_list.extend([{"hi": "world"}, {"spam": "eggs"}])
     assert z["a"]["b"] != extend_list
+
+
+def test_copy_on_write():
+    m1 = {"a": {"b": [{"c": 1}]}, "d": "x"}
+    m2 = {"a": {"b": [{"c": 2}], "e": {"f": 3}}}
+    orig = deepcopy([m1, m2])
+    z = copy_on_write(ChainDB(m1, m2))
+    assert isinstance(z, ChainDB)
+    assert isinstance(z["a"]["b"], list)
+    assert isinstance(z["a"]["b"][0], dict)
+    assert z["a"]["b"] == [{"c": 1}, {"c": 2}]
+    z["a"]["b"][0]["c"] = 5
+    z["a"]["e"]["f"] = 4
+    z["a"]["g"] = 6
+    z["d"] = "y"
+    assert z["a"]["b"] == [{"c": 5}, {"c": 2}]
+    assert z["a"]["e"]["f"] == 4
+    assert z["a"]["g"] == 6
+    assert z["d"] == "y"
+    assert [m1, m2] == orig
+
+
+def test_copy_on_write_dict():
+    src = {"a": {"b": [1, {"c": 2}]}}
+    z = copy_on_write(src)
+    assert isinstance(z, CopyOnWriteDict)
+    assert z == src
+    assert z["a"] is z["a"]
+    z["a"]["b"].append(3)
+    z["a"]["b"][1].pop("c")
+    z.setdefault("x", []).append(1)
+    assert src == {"a": {"b": [1, {"c": 2}]}}
+    assert json.loads(json.dumps(z)) == {"a": {"b": [1, {}, 3]}, "x": [1]}
+    plain = deepcopy(z)
+    assert type(plain) is dict
+    assert type(plain["a"]["b"]) is list
+
+
+def test_merge_maps():
+    m1 = {"a": {"b": [1], "c": {"d": 1}}, "e": 1, "f": {"g": 1}}
+    m2 = {"a": {"b": [2], "c": {"d": 2, "x": 0}}, "e": {"h": 2}, "i": [3]}
+    m3 = {"a": {"b": [3]}, "f": 3}
+    for maps in [(m1,), (m1, m2), (m1, m2, m3), (m3, m2, m1)]:
+        merged = merge_maps(*maps)
+        assert merged == _convert_to_dict(ChainDB(*maps))
+        assert list(merged) == list(ChainDB(*maps))
+    assert merge_maps(m1, m2, m3)["a"]["b"] == [1, 2, 3]
+
+
+def test_merged_collections():
+    calls = []
+
+    def build():
+        calls.append(1)
+        return {"x": {"_id": "x"}}
+
+    merged = MergedCollections({"people": build})
+    assert "people" in merged
+    assert not merged.is_built("people")
+    assert merged["people"] is merged["people"]
+    assert len(calls) == 1
+    merged.invalidate("people")
+    assert not merged.is_built("people")
+    assert merged.get("people") == {"x": {"_id": "x"}}
+    assert len(calls) == 2
+    assert merged.get("groups", {}) == {}
+
+
+def test_memoize():
+    m1 = {"a": {"b": [1], "c": {"d": 1}}}
+    m2 = {"a": {"b": [2], "c": {"d": 2}}}
+    z = ChainDB(m1, m2, memoize=True)
+    assert z["a"] is z["a"]
+    assert z["a"]["b"] is z["a"]["b"]
+    assert z["a"]["b"] == [1, 2]
+    assert z["a"]["c"]["d"] == 2
+    m2["a"]["b"].append(3)
+    assert z["a"]["b"] == [1, 2]
+    z.invalidate()
+    assert z["a"]["b"] == [1, 2, 3]
+    z["a"]["c"]["d"] = 5
+    assert z["a"]["c"]["d"] == 5
+    z["a"] = {"e": 1}
+    assert z["a"] == {"e": 1}
+    plain = ChainDB(m1, m2)
+    assert plain["a"] is not plain["a"]
+
+
+def test_invalidate_collection(monkeypatch):
+    m1 = {"a": {"b": [1]}}
+    m2 = {"a": {"b": [2]}}
+    memoized = {"x": ChainDB(m1, m2, memoize=True),
+                "y": ChainDB(m2, memoize=True)}
+    assert memoized["x"]["a"]["b"] == [1, 2]
+    m2["a"]["b"].append(3)
+    invalidate({"people": memoized}, "people")
+    assert memoized["x"]["a"]["b"] == [1, 2, 3]
+    # documents that do not memoize are not visited
+    calls = []
+    monkeypatch.setattr(ChainDB, "invalidate",
+                        lambda self, key=None: calls.append(self))
+    invalidate({"people": {k: ChainDB(m1) for k in "xyz"}}, "people")
+    assert calls == []
+
+
+def _people_maps(ndbs, npeople=50):
+    return [
+        {
+            "person{}".format(i): {
+                "_id": "person{}".format(i),
+                "name": "Person {}".format(i),
+                "education": [{"institution": "uni{}".format(db),
+                               "degree": "PhD"}],
+                "employment": [{"organization": "org{}".format(db)}],
+                "contact": {"email": "p{}@db{}.org".format(i, db)},
+            }
+            for i in range(npeople)
+        }
+        for db in range(ndbs)
+    ]
+
+
+def _read_all(people):
+    for person in people:
+        for _ in range(10):
+            person["education"]
+            person["employment"]
+            person["contact"]["email"]
+
+
+class _CountingDict(dict):
+    """A dict that counts the lookups a ChainDB makes in it."""
+
+    gets = 0
+
+    def get(self, key, default=None):
+        _CountingDict.gets += 1
+        return super().get(key, default)
+
+
+@pytest.mark.parametrize("ndbs", [2, 3])
+def test_repeated_access_is_memoized(ndbs):
+    maps = _people_maps(ndbs)
+    ids = list(maps[0])
+    lookups = {}
+    for memoize in (False, True):
+        people = [ChainDB(*[_CountingDict(m[k]) for m in maps],
+                          memoize=memoize)
+                  for k in ids]
+        _read_all(people)
+        _CountingDict.gets = 0
+        _read_all(people)
+        lookups[memoize] = _CountingDict.gets
+        assert _convert_to_dict(people[0]) == merge_maps(
+            *[m[ids[0]] for m in maps])
+    # reading the people again only looks keys up in the maps without memos
+    assert lookups[True] == 0
+    assert lookups[False] == len(ids) * 10 * 3 * ndbs
+    person = ChainDB(*[m[ids[0]] for m in maps], memoize=True)
+    assert person["education"] is person["education"]
+    assert person["contact"] is person["contact"]
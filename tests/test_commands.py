@@ -1,6 +1,9 @@
 import subprocess
 from pathlib import Path
 
+from regolith.commands import fast_load_check
+from regolith.runcontrol import RunControl
+
 BILLINGE_TEST = False  # special tests for Billinge group, switch it to False before push to remote
 
 
@@ -15,3 +18,14 @@ def test_fs_to_mongo(make_db):
     #    assert cp0.returncode == 0
     cp1 = subprocess.run(['regolith', 'fs-to-mongo'], cwd=repo)
     assert cp1.returncode == 0
+
+
+def test_fast_load_check():
+    for cmd, target, fast_load in [("add", None, False),
+                                   ("classlist", None, False),
+                                   ("build", None, True),
+                                   ("helper", "u_milestone", False),
+                                   ("helper", "l_milestones", True)]:
+        rc = RunControl(cmd=cmd, helper_target=target, fast_load=True)
+        fast_load_check(rc)
+        assert rc.fast_load is fast_load
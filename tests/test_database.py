@@ -0,0 +1,150 @@
+import os
+import subprocess as sp
+
+import pytest
+
+from regolith import database
+from regolith.database import (
+    dump_databases,
+    fetch_databases,
+    open_dbs,
+    widen_sparse_checkout,
+)
+from regolith.runcontrol import RunControl
+
+
+def _rc(tmpdir, databases, **kw):
+    return RunControl(builddir=str(tmpdir.join("_build")),
+                      backend="filesystem", databases=databases, **kw)
+
+
+def test_fetch_databases(git_db, tmpdir):
+    other = dict(git_db, name="other")
+    rc = _rc(tmpdir, [git_db, other])
+    fetched = list(fetch_databases(rc.databases, rc))
+    assert [db["name"] for db, _ in fetched] == ["test", "other"]
+    assert [error for _, error in fetched] == [None, None]
+    for name in ("test", "other"):
+        assert os.path.isfile(os.path.join(rc.builddir, "_dbs", name, "db",
+                                           "people.yaml"))
+
+
+def test_open_dbs_fetch_error(git_db, tmpdir, capsys):
+    missing = dict(git_db, name="missing",
+                   url=str(tmpdir.join("missing.git")))
+    rc = _rc(tmpdir, [git_db, missing])
+    with pytest.raises(RuntimeError, match="missing"):
+        open_dbs(rc, dbs=["people"])
+    assert "could not fetch database missing" in capsys.readouterr().err
+    client = open_dbs(_rc(tmpdir, [git_db]), dbs=["people"])
+    assert "scopatz" in client.chained_db["people"]
+
+
+def _last_fetch(rc, name):
+    return os.path.getmtime(os.path.join(rc.builddir, "_dbs", name, ".git",
+                                         "regolith_last_fetch"))
+
+
+def test_pull_ttl(git_db, tmpdir, capsys):
+    rc = _rc(tmpdir, [git_db], pull_ttl=10)
+    open_dbs(rc, dbs=["people"])
+    stamp = _last_fetch(rc, "test")
+    capsys.readouterr()
+    open_dbs(rc, dbs=["people"])
+    assert "skipping pull of test" in capsys.readouterr().err
+    assert _last_fetch(rc, "test") == stamp
+    os.utime(os.path.join(rc.builddir, "_dbs", "test", ".git",
+                          "regolith_last_fetch"), (0, 0))
+    open_dbs(rc, dbs=["people"])
+    assert _last_fetch(rc, "test") > 0
+
+
+def test_offline(git_db, tmpdir):
+    rc = _rc(tmpdir, [git_db], offline=True)
+    with pytest.raises(RuntimeError, match="test"):
+        open_dbs(rc, dbs=["people"])
+    open_dbs(_rc(tmpdir, [git_db]), dbs=["people"])
+    # the remote is gone, but the clone can still be used offline
+    os.rename(git_db["url"], git_db["url"] + ".moved")
+    client = open_dbs(rc, dbs=["people"])
+    assert "scopatz" in client.chained_db["people"]
+
+
+def test_sparse_checkout(git_db, tmpdir):
+    # git ignores --depth for clones of plain local paths
+    git_db = dict(git_db, url="file://" + git_db["url"])
+    rc = _rc(tmpdir, [git_db], sparse_checkout=True)
+    dbdir = os.path.join(rc.builddir, "_dbs", "test")
+    dbpath = os.path.join(dbdir, "db")
+    client = open_dbs(rc, dbs=["people"])
+    assert os.listdir(dbpath) == ["people.yaml"]
+    shallow = sp.check_output(["git", "rev-parse", "--is-shallow-repository"],
+                              cwd=dbdir, universal_newlines=True)
+    assert shallow.strip() == "true"
+    assert set(client.dbs["test"]) == {"people"}
+    client = open_dbs(rc, dbs=["people", "citations"])
+    assert sorted(os.listdir(dbpath)) == ["citations.json", "people.yaml"]
+    assert set(client.dbs["test"]) == {"people", "citations"}
+    open_dbs(rc)
+    assert len(os.listdir(dbpath)) > 2
+
+
+def test_sparse_checkout_offline(git_db, tmpdir, capsys):
+    rc = _rc(tmpdir, [git_db], sparse_checkout=True)
+    open_dbs(rc, dbs=["people"])
+    rc = _rc(tmpdir, [git_db], sparse_checkout=True, offline=True)
+    client = open_dbs(rc, dbs=["people"])
+    assert set(client.dbs["test"]) == {"people"}
+    capsys.readouterr()
+    with pytest.raises(RuntimeError, match="test"):
+        open_dbs(rc, dbs=["people", "citations"])
+    assert "without citations, which" in capsys.readouterr().err
+    with pytest.raises(RuntimeError, match="test"):
+        open_dbs(rc)
+    assert "without all of its collections" in capsys.readouterr().err
+
+
+def test_sparse_checkout_widen(git_db, tmpdir):
+    rc = _rc(tmpdir, [git_db], sparse_checkout=True)
+    open_dbs(rc, dbs=["people"])
+    dbdir = os.path.join(rc.builddir, "_dbs", "test")
+    with open(os.path.join(dbdir, "db", "newcoll.yaml"), "w") as f:
+        f.write("new:\n  name: New\n")
+    with pytest.raises(sp.CalledProcessError):
+        sp.check_call(["git", "add", "db/newcoll.yaml"], cwd=dbdir)
+    widen_sparse_checkout(dbdir, ["/db/newcoll.yaml"])
+    sp.check_call(["git", "add", "db/newcoll.yaml"], cwd=dbdir)
+    widen_sparse_checkout(dbdir, None)
+    assert not os.path.exists(os.path.join(dbdir, ".git", "info",
+                                           "sparse-checkout"))
+    assert "groups.yaml" in os.listdir(os.path.join(dbdir, "db"))
+
+
+def test_dump_databases(git_db, tmpdir, monkeypatch):
+    for var in ("GIT_AUTHOR", "GIT_COMMITTER"):
+        monkeypatch.setenv(var + "_NAME", "regolith")
+        monkeypatch.setenv(var + "_EMAIL", "r@example.com")
+    other = dict(git_db, name="other")
+    rc = _rc(tmpdir, [git_db, other])
+    client = open_dbs(rc, dbs=["people"])
+    calls = []
+    git = database._git
+    monkeypatch.setattr(database, "_git",
+                        lambda args, cwd=None: calls.append(args)
+                        or git(args, cwd=cwd))
+    dump_databases(rc.databases, client, rc)
+    assert calls == []
+    # rewriting a document without changing it does not touch git either
+    scopatz = client.find_one("test", "people", {"_id": "scopatz"})
+    client.update_one("test", "people", {"_id": "scopatz"},
+                      {"name": scopatz["name"]})
+    dump_databases(rc.databases, client, rc)
+    assert calls == []
+    client.update_one("test", "people", {"_id": "scopatz"},
+                      {"name": "Tony"})
+    client.update_one("other", "people", {"_id": "scopatz"},
+                      {"name": "Anthony"})
+    dump_databases(rc.databases, client, rc)
+    assert [args[0] for args in calls].count("push") == 2
+    log = sp.check_output(["git", "log", "--format=%s"], cwd=git_db["url"])
+    assert log.decode().splitlines()[0] == "regolith auto-commit"
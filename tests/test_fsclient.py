@@ -0,0 +1,311 @@
+import os
+
+import pytest
+from ruamel.yaml.comments import CommentedMap
+
+from regolith.chained_db import MergedCollections
+from regolith.database import open_dbs
+from regolith.fsclient import (
+    FileSystemClient,
+    JSONLinesCollection,
+    load_cached,
+    load_json,
+    load_json_indexed,
+    load_yaml,
+    load_yaml_fast,
+)
+from regolith.runcontrol import RunControl
+
+
+@pytest.mark.parametrize("workers", [2, 4])
+def test_parallel_load(fs_db, workers):
+    serial = FileSystemClient(RunControl(builddir="_build"))
+    serial.load_database(fs_db)
+    parallel = FileSystemClient(
+        RunControl(builddir="_build", load_workers=workers)
+    )
+    parallel.load_database(fs_db)
+    assert parallel.dbs == serial.dbs
+    assert parallel._collexts == serial._collexts
+    assert parallel._collfiletypes == serial._collfiletypes
+    assert set(parallel._yamlinsts) == set(serial._yamlinsts)
+
+
+def test_load_cached(fs_db, tmpdir):
+    filename = os.path.join(fs_db["url"], "db", "people.yaml")
+    cachedir = str(tmpdir.mkdir("cache"))
+    calls = []
+
+    def loader(f):
+        calls.append(f)
+        return load_yaml(f)
+
+    first = load_cached(filename, loader, cachedir)
+    second = load_cached(filename, loader, cachedir)
+    assert first == second
+    assert len(calls) == 1
+    # touching the file without changing it is still a hit
+    os.utime(filename, ns=(0, 0))
+    assert load_cached(filename, loader, cachedir) == first
+    assert len(calls) == 1
+    with open(filename, "a", encoding="utf-8") as fh:
+        fh.write("newguy:\n  name: New Guy\n")
+    third = load_cached(filename, loader, cachedir)
+    assert len(calls) == 2
+    assert third["newguy"]["name"] == "New Guy"
+
+
+def test_dbcache(fs_db, tmpdir):
+    builddir = str(tmpdir.join("_build"))
+    rc = RunControl(builddir=builddir, dbcache=True)
+    client = FileSystemClient(rc)
+    client.load_database(fs_db)
+    assert len(os.listdir(os.path.join(builddir, "_dbcache"))) > 0
+    cached = FileSystemClient(rc)
+    cached.load_database(fs_db)
+    assert cached.dbs == client.dbs
+
+
+def test_dump_only_dirty(fs_db):
+    client = FileSystemClient(RunControl(builddir="_build"))
+    client.load_database(fs_db)
+    assert client.dump_database(fs_db) == []
+    client.insert_one("test", "people", {"_id": "newguy", "name": "New Guy"})
+    client.update_one("test", "citations", {"_id": "meurer2016sympy"},
+                      {"year": "1999"})
+    to_add = client.dump_database(fs_db)
+    assert sorted(to_add) == [os.path.join("db", "citations.json"),
+                              os.path.join("db", "people.yaml")]
+    assert client.dump_database(fs_db) == []
+    # collections that are written out unchanged are not listed
+    client.update_one("test", "people", {"_id": "newguy"},
+                      {"name": "New Guy"})
+    assert client.dump_database(fs_db) == []
+
+
+def test_lazy_load(fs_db):
+    client = FileSystemClient(RunControl(builddir="_build", lazy_load=True))
+    client.load_database(fs_db)
+    colls = client.dbs["test"]
+    assert "people" in colls
+    assert not colls.is_loaded("people")
+    assert not colls.is_loaded("citations")
+    assert client.find_one("test", "people", {"_id": "scopatz"})["_id"] \
+        == "scopatz"
+    assert colls.is_loaded("people")
+    assert not colls.is_loaded("citations")
+    eager = FileSystemClient(RunControl(builddir="_build"))
+    eager.load_database(fs_db)
+    assert colls == eager.dbs["test"]
+
+
+def test_lazy_open_dbs(fs_db):
+    rc = RunControl(builddir="_build", backend="filesystem", lazy_load=True,
+                    databases=[fs_db])
+    client = open_dbs(rc, dbs=["people", "groups"])
+    assert not client.dbs["test"].is_loaded("people")
+    assert not client.chained_db.is_loaded("people")
+    people = list(client.all_documents("people"))
+    assert "scopatz" in [p["_id"] for p in people]
+    assert client.dbs["test"].is_loaded("people")
+    assert not client.dbs["test"].is_loaded("groups")
+
+
+def test_fast_load(fs_db):
+    client = FileSystemClient(RunControl(builddir="_build", fast_load=True))
+    client.load_database(fs_db)
+    rt = FileSystemClient(RunControl(builddir="_build"))
+    rt.load_database(fs_db)
+    assert client.dbs == rt.dbs
+    # documents changed in place before a write are kept
+    doc = client.find_one("test", "people", {"_id": "scopatz"})
+    doc["bio"] = "changed"
+    client.update_one("test", "people", {"_id": "scopatz"}, {"aka": ["Tony"]})
+    assert ("test", "people") in client._dirty
+    assert client.find_one("test", "people", {"_id": "scopatz"})["bio"] \
+        == "changed"
+    rt.find_one("test", "people", {"_id": "scopatz"})["bio"] = "changed"
+    rt.update_one("test", "people", {"_id": "scopatz"}, {"aka": ["Tony"]})
+    assert client.dbs["test"]["people"] == rt.dbs["test"]["people"]
+    # dumping would drop the comments of the file
+    with pytest.raises(RuntimeError, match="people of database test"):
+        client.dump_database(fs_db)
+
+
+def test_load_yaml_fast_aliased_document(tmpdir):
+    filename = str(tmpdir.join("coll.yaml"))
+    with open(filename, "w", encoding="utf-8") as fh:
+        fh.write("base: &b\n  tags: [x]\nref: *b\n")
+    docs = load_yaml_fast(filename)
+    assert docs["base"]["_id"] == "base"
+    assert docs["ref"]["_id"] == "ref"
+    docs["ref"]["tags"].append("y")
+    assert docs["base"]["tags"] == ["x"]
+
+
+def test_load_yaml_base_types(tmpdir):
+    filename = str(tmpdir.join("coll.yaml"))
+    with open(filename, "w", encoding="utf-8") as fh:
+        fh.write(
+            "base: &base\n"
+            "  x: 1.50  # a comment\n"
+            "  y: [1, 2]\n"
+            "derived:\n"
+            "  <<: *base\n"
+            "  x: 2.0\n"
+            "  z: {a: b}\n"
+        )
+    docs = load_yaml(filename)
+    assert type(docs) is dict
+    assert type(docs["base"]) is dict
+    assert type(docs["base"]["y"]) is list
+    assert type(docs["derived"]["z"]) is dict
+    assert docs["derived"]["x"] == 2.0
+    assert docs["derived"]["y"] == [1, 2]
+    assert docs["derived"]["_id"] == "derived"
+    commented = load_yaml(filename, commented=True)
+    assert isinstance(commented, CommentedMap)
+    assert isinstance(commented["base"], CommentedMap)
+    assert commented == docs
+
+
+def test_load_yaml_aliased_document(tmpdir):
+    filename = str(tmpdir.join("coll.yaml"))
+    with open(filename, "w", encoding="utf-8") as fh:
+        fh.write(
+            "base: &b\n"
+            "  name: Base\n"
+            "  tags: &t [x, y]\n"
+            "ref: *b\n"
+            "other:\n"
+            "  tags: *t\n"
+        )
+    for commented in (False, True):
+        docs = load_yaml(filename, commented=commented)
+        assert docs["base"]["_id"] == "base"
+        assert docs["ref"]["_id"] == "ref"
+        assert docs["ref"]["name"] == "Base"
+        docs["ref"]["tags"].append("z")
+        assert docs["base"]["tags"] == ["x", "y"]
+        assert docs["other"]["tags"] == ["x", "y"]
+
+
+def test_load_json_indexed(fs_db, tmpdir):
+    filename = os.path.join(fs_db["url"], "db", "citations.json")
+    indexdir = str(tmpdir.mkdir("index"))
+    expected = load_json(filename)
+    docs = load_json_indexed(filename, indexdir=indexdir)
+    assert isinstance(docs, JSONLinesCollection)
+    assert len(os.listdir(indexdir)) == 1
+    assert list(docs) == list(expected)
+    assert all(isinstance(v, tuple) for v in docs._data.values())
+    _id = list(expected)[-1]
+    assert docs[_id] == expected[_id]
+    assert docs[_id] is docs[_id]
+    assert sum(isinstance(v, tuple) for v in docs._data.values()) \
+        == len(expected) - 1
+    assert load_json_indexed(filename, indexdir=indexdir) == expected
+
+
+def test_indexed_json_client(fs_db, tmpdir):
+    rc = RunControl(builddir=str(tmpdir.join("_build")), indexed_json=True)
+    client = FileSystemClient(rc)
+    client.load_database(fs_db)
+    coll = client.dbs["test"]["citations"]
+    assert isinstance(coll, JSONLinesCollection)
+    doc = client.find_one("test", "citations", {"_id": "meurer2016sympy"})
+    assert doc["_id"] == "meurer2016sympy"
+    assert client.find_one("test", "citations",
+                           {"_id": "meurer2016sympy", "year": "1900"}) is None
+    client.update_one("test", "citations", {"_id": "meurer2016sympy"},
+                      {"year": "2017"})
+    client.dump_database(fs_db)
+    filename = os.path.join(fs_db["url"], "db", "citations.json")
+    assert load_json(filename)["meurer2016sympy"]["year"] == "2017"
+    # the dump released the old file and the collection is still usable
+    assert coll._fh.closed
+    assert coll["meurer2016sympy"]["year"] == "2017"
+
+
+def test_indexed_json_client_close(fs_db, tmpdir):
+    rc = RunControl(builddir=str(tmpdir.join("_build")), indexed_json=True,
+                    lazy_load=True)
+    client = FileSystemClient(rc)
+    client.load_database(fs_db)
+    coll = client.dbs["test"]["citations"]
+    assert not client.dbs["test"].is_loaded("people")
+    client.close()
+    assert coll._fh.closed and coll._mm is None
+    with pytest.raises(ValueError, match="closed"):
+        coll[next(iter(coll))]
+
+
+def test_indexed_json_open_dbs(fs_db, tmpdir):
+    rc = RunControl(builddir=str(tmpdir.join("_build")), backend="filesystem",
+                    indexed_json=True, databases=[fs_db])
+    client = open_dbs(rc, dbs=["citations"])
+    chained = client.chained_db["citations"]
+    assert not chained.is_loaded("meurer2016sympy")
+    assert chained["meurer2016sympy"]["_id"] == "meurer2016sympy"
+    docs = list(client.all_documents("citations"))
+    assert "meurer2016sympy" in [d["_id"] for d in docs]
+
+
+def test_field_index(fs_db):
+    rc = RunControl(builddir="_build", indexes={"people": ["name"]})
+    client = FileSystemClient(rc)
+    client.load_database(fs_db)
+    client.create_index("test", "grants", "alias")
+    doc = client.find_one("test", "people", {"name": "Anthony Scopatz"})
+    assert doc["_id"] == "scopatz"
+    index = client._indexes["test", "people"]["name"]
+    assert index.get("Anthony Scopatz") == ["scopatz"]
+    assert client.find_one("test", "people", {"name": "Nobody"}) is None
+    client.insert_one("test", "people", {"_id": "newguy", "name": "New Guy"})
+    assert client.find_one("test", "people", {"name": "New Guy"})["_id"] \
+        == "newguy"
+    client.update_one("test", "people", {"name": "New Guy"},
+                      {"name": "Old Guy"})
+    assert client.find_one("test", "people", {"name": "New Guy"}) is None
+    assert client.find_one("test", "people", {"name": "Old Guy"})["_id"] \
+        == "newguy"
+    client.delete_one("test", "people", {"_id": "newguy"})
+    assert client.find_one("test", "people", {"name": "Old Guy"}) is None
+    assert index.get("Old Guy") == []
+    grant = client.find_one("test", "grants", {"alias": "sym"})
+    assert grant["_id"] == "SymPy-1.1"
+
+
+def test_field_index_keeps_collection_order(fs_db):
+    rc = RunControl(builddir="_build", indexes={"people": ["group"]})
+    client = FileSystemClient(rc)
+    client.load_database(fs_db)
+    for _id in ("a", "b", "c"):
+        client.insert_one("test", "people",
+                          {"_id": _id, "group": "x" if _id == "b" else "y"})
+    assert client.find_one("test", "people", {"group": "y"})["_id"] == "a"
+    # moving "b" into the group must not put it after "c"
+    client.update_one("test", "people", {"_id": "b"}, {"group": "y"})
+    client.update_one("test", "people", {"_id": "a"}, {"group": "z"})
+    scan = [d["_id"] for d in client.dbs["test"]["people"].values()
+            if d.get("group") == "y"]
+    assert scan == ["b", "c"]
+    assert client.find_one("test", "people", {"group": "y"})["_id"] == "b"
+    index = client._indexes["test", "people"]["group"]
+    assert index.get("y") == scan
+
+
+def test_merged_snapshots_open_dbs(fs_db):
+    chained = open_dbs(RunControl(builddir="_build", backend="filesystem",
+                                  databases=[fs_db]), dbs=["people"])
+    rc = RunControl(builddir="_build", backend="filesystem",
+                    merged_snapshots=True, databases=[fs_db])
+    client = open_dbs(rc, dbs=["people"])
+    assert isinstance(client.chained_db, MergedCollections)
+    people = client.chained_db["people"]
+    assert type(people["scopatz"]) is dict
+    assert people == chained.chained_db["people"]
+    client.update_one("test", "people", {"_id": "scopatz"}, {"aka": ["Tony"]})
+    assert not client.chained_db.is_built("people")
+    docs = {d["_id"]: d for d in client.all_documents("people")}
+    assert docs["scopatz"]["aka"] == ["Tony"]
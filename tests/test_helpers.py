@@ -1,7 +1,11 @@
+import json
 import os
+import shutil
+from datetime import date
 from pathlib import Path
 import pytest
 
+from regolith.fsclient import load_yaml
 from regolith.main import main
 
 helper_map = [
@@ -328,3 +332,30 @@ def assert_outputs(builddir, expecteddir):
                                 assert expected == actual
                     else:
                         assert expected == actual
+
+
+def test_db_helper_fast_load(make_db, tmpdir):
+    repo = Path(str(tmpdir)) / "repo"
+    shutil.copytree(make_db, str(repo))
+    cwd = os.getcwd()
+    os.chdir(repo)
+    try:
+        with open("regolithrc.json", encoding="utf-8") as f:
+            rc = json.load(f)
+        rc["databases"][0]["url"] = str(repo)
+        rc["fast_load"] = True
+        with open("regolithrc.json", "w", encoding="utf-8") as f:
+            json.dump(rc, f)
+        main(args=["helper", "u_milestone", "20sb_firstprojectum",
+                   "--index", "5", "--status", "converged",
+                   "--due_date", "2020-06-01"])
+    finally:
+        os.chdir(cwd)
+    projecta = load_yaml(str(repo / "db" / "projecta.yaml"))
+    prum = projecta["20sb_firstprojectum"]
+    # the helper turns every due date into a date in place
+    due_dates = [m["due_date"] for m in prum["milestones"]] \
+        + [prum[k]["due_date"] for k in ("deliverable", "kickoff")
+           if k in prum]
+    assert date(2020, 6, 1) in due_dates
+    assert all(isinstance(d, date) for d in due_dates)
@@ -0,0 +1,278 @@
+import os
+from collections import defaultdict
+
+import pymongo.errors
+import pytest
+
+from regolith import mongoclient
+from regolith.fsclient import load_json, load_yaml
+from regolith.mongoclient import (
+    MongoClient,
+    bulk_import,
+    export_collection,
+    import_collections,
+    load_import_file,
+)
+from regolith.runcontrol import RunControl
+
+
+class FakeCollection:
+    """Just enough of a pymongo collection for the client."""
+
+    def __init__(self, docs=()):
+        self.docs = list(docs)
+        self.finds = []
+        self.writes = []
+
+    def find(self, filter=None, projection=None, batch_size=0):
+        self.finds.append(projection)
+        for doc in self.docs:
+            if projection is None:
+                yield dict(doc)
+            else:
+                yield {k: v for k, v in doc.items()
+                       if k == "_id" or k in projection}
+
+    def insert_many(self, docs, ordered=True):
+        assert not ordered
+        self.writes.append(("insert", len(docs)))
+        self.docs.extend(docs)
+
+    def bulk_write(self, requests, ordered=True):
+        assert not ordered
+        self.writes.append(("upsert", len(requests)))
+        for request in requests:
+            doc = request._doc
+            self.docs = [d for d in self.docs if d["_id"] != doc["_id"]]
+            self.docs.append(doc)
+
+
+class FakeDatabase(dict):
+    def __missing__(self, key):
+        self[key] = FakeCollection()
+        return self[key]
+
+    def list_collection_names(self):
+        return list(self)
+
+
+def _client(rc, mongo):
+    """Makes a client without connecting to a server."""
+    client = MongoClient.__new__(MongoClient)
+    client.rc = rc
+    client.client = mongo
+    client.dbs = defaultdict(lambda: defaultdict(dict))
+    client.chained_db = dict()
+    client._identity_indexes = {}
+    client._fragment_indexes = {}
+    client._pinger = None
+    client.closed = False
+    return client
+
+
+def _fake_mongo():
+    people = FakeCollection([{"_id": "scopatz", "name": "Anthony Scopatz",
+                              "aka": ["Tony"], "bio": "long"}])
+    groups = FakeCollection([{"_id": "ergs", "name": "ERGS"}])
+    return {"test": FakeDatabase(people=people, groups=groups)}
+
+
+def test_load_database_whitelist():
+    mongo = _fake_mongo()
+    client = _client(RunControl(), mongo)
+    client.load_database({"name": "test", "whitelist": ["people"]})
+    assert set(client.dbs["test"]) == {"people"}
+    assert mongo["test"]["groups"].finds == []
+    client.load_database({"name": "test", "whitelist": []})
+    assert set(client.dbs["test"]) == {"people", "groups"}
+
+
+def test_load_database_projection():
+    mongo = _fake_mongo()
+    rc = RunControl(projections={"people": ["name", "aka"]})
+    client = _client(rc, mongo)
+    client.load_database({"name": "test"})
+    assert client.dbs["test"]["people"]["scopatz"] == {
+        "_id": "scopatz", "name": "Anthony Scopatz", "aka": ["Tony"]}
+    assert mongo["test"]["people"].finds == [["name", "aka"]]
+    assert mongo["test"]["groups"].finds == [None]
+
+
+def test_bulk_import():
+    col = FakeCollection()
+    docs = [{"_id": i} for i in range(5)]
+    assert bulk_import(col, iter(docs), batch_size=2) == 5
+    assert col.writes == [("insert", 2), ("insert", 2), ("insert", 1)]
+    assert bulk_import(col, [{"_id": 0, "x": 1}], upsert=True) == 1
+    assert col.writes[-1] == ("upsert", 1)
+    assert len(col.docs) == 5
+    assert {"_id": 0, "x": 1} in col.docs
+
+
+def test_import_collections(fs_db):
+    dbpath = os.path.join(fs_db["url"], fs_db["path"])
+    mongodb = FakeDatabase()
+    counts = import_collections(mongodb, dbpath, blacklist=["groups.yaml"])
+    assert "groups" not in counts
+    assert counts["citations"] == len(mongodb["citations"].docs) > 0
+    people = {d["_id"]: d for d in mongodb["people"].docs}
+    assert people == load_import_file(os.path.join(dbpath, "people.yaml"))
+
+
+def test_import_database_uri(fs_db, monkeypatch):
+    uris = []
+
+    class UriClient(dict):
+        closed = False
+
+        def __missing__(self, key):
+            self[key] = FakeDatabase()
+            return self[key]
+
+        def close(self):
+            self.closed = True
+
+    def make_client(uri):
+        uris.append(UriClient())
+        return uris[-1]
+
+    monkeypatch.setattr(mongoclient.pymongo, "MongoClient", make_client)
+    client = _client(RunControl(mongo_batch_size=10), _fake_mongo())
+    client.import_database(dict(fs_db, dst_url="mongodb://example"))
+    assert len(uris[0]["test"]["people"].docs) > 0
+    assert uris[0].closed
+
+
+def test_load_import_file_timestamps(tmpdir):
+    filename = str(tmpdir.join("events.yaml"))
+    with open(filename, "w") as f:
+        f.write("party:\n  date: 2020-01-01\n")
+    # bson can not encode dates, so timestamps are kept as strings
+    assert load_import_file(filename) == {
+        "party": {"_id": "party", "date": "2020-01-01"}}
+
+
+def test_export_collection(tmpdir):
+    col = FakeCollection([{"_id": "b", "x": 1}, {"_id": "a", "y": [1, 2]}])
+    filename = str(tmpdir.join("coll.json"))
+    assert export_collection(col, filename, batch_size=1)
+    with open(filename, encoding="utf-8") as fh:
+        lines = fh.read().splitlines()
+    assert [line[:10] for line in lines] == ['{"_id": "a', '{"_id": "b']
+    assert load_json(filename)["b"] == {"_id": "b", "x": 1}
+    assert not export_collection(col, filename)
+    assert os.listdir(str(tmpdir)) == ["coll.json"]
+
+
+def test_dump_database(tmpdir):
+    mongo = _fake_mongo()
+    mongo["test"]["system.views"].docs.append({"_id": "v"})
+    dbdir = tmpdir.mkdir("test")
+    dbdir.mkdir("db").join("people.yaml").write("scopatz:\n  name: Old\n")
+    rc = RunControl(builddir=str(tmpdir), mongo_batch_size=10)
+    client = _client(rc, mongo)
+    db = {"name": "test", "url": str(dbdir), "path": "db", "local": True}
+    to_add = client.dump_database(db)
+    assert sorted(to_add) == [os.path.join("db", "groups.json"),
+                              os.path.join("db", "people.yaml")]
+    dbpath = os.path.join(str(dbdir), "db")
+    assert sorted(os.listdir(dbpath)) == ["groups.json", "people.yaml"]
+    assert load_yaml(os.path.join(dbpath, "people.yaml"))["scopatz"]["aka"] \
+        == ["Tony"]
+    assert client.dump_database(db) == []
+    mongo["test"]["groups"].docs[0]["name"] = "Other"
+    assert client.dump_database(db) == [os.path.join("db", "groups.json")]
+
+
+class FakePymongoClient:
+    """A pymongo client of a server that answers after some pings."""
+
+    def __init__(self, host, server, **kwargs):
+        self.host = host
+        self.kwargs = kwargs
+        self.server = server
+        self.closed = False
+        self.admin = self
+
+    def command(self, name):
+        assert name == "ping"
+        self.server["pings"] += 1
+        if self.server["pings"] <= self.server["fail"]:
+            raise pymongo.errors.ServerSelectionTimeoutError("not yet")
+        return {"ok": 1.0}
+
+    def close(self):
+        self.closed = True
+
+
+class FakeProc:
+    """A mongod process that has exited with returncode, if it is not
+    None."""
+
+    def __init__(self, returncode=None):
+        self.returncode = returncode
+
+    def poll(self):
+        return self.returncode
+
+
+def _open(monkeypatch, rc, fail, returncode=None):
+    clients = []
+    sleeps = []
+    started = []
+
+    server = {"fail": fail, "pings": 0}
+
+    def make_client(host, **kwargs):
+        clients.append(FakePymongoClient(host, server, **kwargs))
+        return clients[-1]
+
+    def startserver(self):
+        started.append(True)
+        self.proc = FakeProc(returncode)
+
+    monkeypatch.setattr(mongoclient.pymongo, "MongoClient", make_client)
+    monkeypatch.setattr(mongoclient.time, "sleep", sleeps.append)
+    monkeypatch.setattr(MongoClient, "_preclean", lambda self: None)
+    monkeypatch.setattr(MongoClient, "_startserver", startserver)
+    client = MongoClient(rc)
+    return client, clients, sleeps, started
+
+
+def test_open_running_server(monkeypatch):
+    rc = RunControl(host="localhost", mongo_pool_size=5)
+    client, clients, sleeps, started = _open(monkeypatch, rc, fail=0)
+    assert clients[0].kwargs == {"maxPoolSize": 5}
+    # only the pings time out quickly, from a client kept for them
+    assert clients[1].kwargs == {
+        "serverSelectionTimeoutMS": mongoclient.PING_TIMEOUT_MS}
+    assert client.is_alive()
+    assert len(clients) == 2
+    assert started == []
+    assert sleeps == []
+    client.close()
+    assert clients[0].closed
+    assert clients[1].closed
+
+
+def test_open_waits_for_server(monkeypatch):
+    rc = RunControl(host="localhost")
+    client, clients, sleeps, started = _open(monkeypatch, rc, fail=5,
+                                             returncode=0)
+    assert started == [True]
+    assert len(clients) == 2
+    assert clients[1].server["pings"] == 6
+    assert sleeps == [0.01, 0.02, 0.04, 0.08]
+    assert not client.closed
+
+
+def test_open_times_out(monkeypatch):
+    rc = RunControl(host="localhost", mongo_timeout=0.0)
+    with pytest.raises(RuntimeError, match="did not become ready"):
+        _open(monkeypatch, rc, fail=10)
+
+
+def test_open_mongod_fails(monkeypatch):
+    rc = RunControl(host="localhost")
+    with pytest.raises(RuntimeError, match="exited with status 48"):
+        _open(monkeypatch, rc, fail=10, returncode=48)
@@ -0,0 +1,92 @@
+import datetime
+import os
+
+from regolith.database import open_dbs
+from regolith.fsclient import FileSystemClient, load_json, load_yaml
+from regolith.runcontrol import RunControl
+from regolith.sqliteclient import SQLiteClient, SQLiteCollection
+
+
+def _rc(fs_db, tmpdir, **kwargs):
+    return RunControl(builddir=str(tmpdir.join("_build")),
+                      sqlitepath=str(tmpdir.join("regolith.sqlite")),
+                      databases=[fs_db], **kwargs)
+
+
+def test_import_and_load(fs_db, tmpdir):
+    rc = _rc(fs_db, tmpdir)
+    client = SQLiteClient(rc)
+    client.import_database(fs_db)
+    client.load_database(fs_db)
+    fs = FileSystemClient(rc)
+    fs.load_database(fs_db)
+    assert client.collection_names("test") == set(fs.dbs["test"])
+    people = client.dbs["test"]["people"]
+    assert isinstance(people, SQLiteCollection)
+    assert set(people) == set(fs.dbs["test"]["people"])
+    assert people["scopatz"]["name"] == fs.dbs["test"]["people"]["scopatz"]["name"]
+    client.close()
+
+
+def test_crud(fs_db, tmpdir):
+    rc = _rc(fs_db, tmpdir)
+    client = SQLiteClient(rc)
+    client.import_database(fs_db)
+    client.load_database(fs_db)
+    doc = client.find_one("test", "people", {"name": "Anthony Scopatz"})
+    assert doc["_id"] == "scopatz"
+    assert client.find_one("test", "people", {"_id": "scopatz"}) is doc
+    assert client.find_one("test", "people", {"_id": "nobody"}) is None
+    client.insert_one("test", "people", {"_id": "newguy", "name": "New Guy"})
+    client.update_one("test", "people", {"_id": "newguy"}, {"aka": ["NG"]})
+    client.close()
+    # writes are committed immediately
+    client = SQLiteClient(rc)
+    client.load_database(fs_db)
+    assert client.find_one("test", "people", {"name": "New Guy"})["aka"] == ["NG"]
+    client.delete_one("test", "people", {"_id": "newguy"})
+    assert "newguy" not in client.dbs["test"]["people"]
+    client.close()
+
+
+def test_dates_round_trip(fs_db, tmpdir):
+    rc = _rc(fs_db, tmpdir)
+    client = SQLiteClient(rc)
+    client.load_database(fs_db)
+    doc = {"_id": "dated", "date": datetime.date(2020, 5, 17),
+           "time": datetime.datetime(2020, 5, 17, 9, 30),
+           "text": "2020-05-17"}
+    client.insert_one("test", "people", doc)
+    client.close()
+    client = SQLiteClient(rc)
+    client.load_database(fs_db)
+    assert client.dbs["test"]["people"]["dated"] == doc
+    client.close()
+
+
+def test_dump_database(fs_db, tmpdir):
+    rc = _rc(fs_db, tmpdir)
+    client = SQLiteClient(rc)
+    client.import_database(fs_db)
+    out = dict(fs_db, url=str(tmpdir.join("out")))
+    to_add = client.dump_database(out)
+    assert os.path.join("db", "citations.json") in to_add
+    assert os.path.join("db", "people.yaml") in to_add
+    dbpath = os.path.join(out["url"], "db")
+    expected = load_json(os.path.join(fs_db["url"], "db", "citations.json"))
+    assert load_json(os.path.join(dbpath, "citations.json")) == expected
+    assert "scopatz" in load_yaml(os.path.join(dbpath, "people.yaml"))
+    client.close()
+
+
+def test_open_dbs(fs_db, tmpdir):
+    rc = _rc(fs_db, tmpdir, backend="sqlite")
+    client = SQLiteClient(rc)
+    client.import_database(fs_db)
+    client.close()
+    client = open_dbs(rc, dbs=["people"])
+    assert set(client.dbs["test"]) == {"people"}
+    assert not client.chained_db["people"].is_loaded("scopatz")
+    ids = [doc["_id"] for doc in client.all_documents("people")]
+    assert "scopatz" in ids
+    client.close()
@@ -2,12 +2,17 @@ import pytest
 import datetime as dt
 from regolith.tools import (
     filter_publications,
+    IdentityIndex,
+    TrigramIndex,
+    FragmentIndex,
+    collection_fragment_retrieval,
     fuzzy_retrieval,
     fragment_retrieval,
     number_suffix,
     latex_safe,
     update_schemas,
     merge_collections,
+    join_collections,
     group,
     is_fully_appointed,
     group_member_ids,
@@ -20,8 +25,19 @@ from regolith.tools import (
     search_collection,
     collect_appts,
     grant_burn,
-    validate_meeting
+    validate_meeting,
+    get_person,
+    path_values,
+    compile_path,
+    document_by_value,
+    ValueIndex,
+    substring,
+    equals,
+    date_range,
+    select,
     )
+from regolith.fsclient import FileSystemClient
+from regolith.runcontrol import RunControl
 
 
 def test_author_publications():
@@ -54,6 +70,103 @@ def test_fuzzy_retrieval():
     )
 
 
+def test_fuzzy_retrieval_generator():
+    people = [{"_id": "a", "name": "Ann"}, {"_id": "b", "aka": ["ANN", "Bo"]}]
+    assert fuzzy_retrieval(iter(people), ["aka", "name"], "ann") is None
+    assert fuzzy_retrieval(iter(people), ["aka", "name"], "ann",
+                           case_sensitive=False) == people[0]
+    assert fuzzy_retrieval(iter(people), ["aka"], "ann",
+                           case_sensitive=False) == people[1]
+    assert fuzzy_retrieval(iter(people), ["aka"], None,
+                           case_sensitive=False) is None
+
+
+def test_identity_index():
+    people = [{"_id": "a", "name": "Ann", "aka": [1, ["x"]]},
+              {"_id": "b", "aka": ["ANN", "Straße"]}]
+    index = IdentityIndex(people, case_sensitive=False)
+    assert index.get("ann") is people[0]
+    assert index.get("STRASSE") is people[1]
+    assert index.get(1) is None
+    index = IdentityIndex(people, sources=["aka"])
+    assert index.get("ANN") is people[1]
+    assert index.get(1) is people[0]
+    assert index.get(["x"]) is None
+    # fuzzy_retrieval scans, so it sees edits made in place
+    assert fuzzy_retrieval(people, ["aka"], "ann",
+                           case_sensitive=False) is people[1]
+    people[1]["aka"] = ["Bea"]
+    people[0]["aka"] = ["Ann"]
+    assert fuzzy_retrieval(people, ["aka"], "ann",
+                           case_sensitive=False) is people[0]
+
+
+def test_trigram_index():
+    docs = [{"_id": "a", "name": "Anthony Scopatz"},
+            {"_id": "b", "aka": ["Bo", "SCOPE"], "name": 1},
+            {"_id": "c", "name": ["x", 3]}]
+    index = TrigramIndex(docs, "name")
+    assert index.candidates("SCOP") == {0}
+    assert index.candidates("zzz") == set()
+    assert index.candidates("sc") is None
+    assert TrigramIndex(docs, "aka").candidates("scop") == {1}
+    assert TrigramIndex(docs, "aka", case_sensitive=True) \
+        .candidates("scop") == set()
+    assert TrigramIndex(docs, "name", case_sensitive=True) \
+        .candidates("Scop") == {0, 1, 2}
+
+
+def test_fragment_index():
+    docs = [{"_id": "a", "name": "Anthony Scopatz"},
+            {"_id": "b", "aka": ["Bo", "SCOPE"]},
+            {"_id": "c", "name": "Cy"}]
+    index = FragmentIndex(docs, ["name", "aka"])
+    assert index.candidates(["name", "aka"], "scop") == docs[:2]
+    assert index.candidates(["name"], "hony s") == [docs[0]]
+    assert index.candidates(["name"], "c") is index.documents
+    assert index.candidates(["_id"], "scop") is index.documents
+
+
+def test_collection_fragment_retrieval(fs_db):
+    rc = RunControl(builddir="_build",
+                    fragment_indexes={"people": ["name", "aka"]})
+    client = FileSystemClient(rc)
+    client.load_database(fs_db)
+    client.chained_db = client.dbs["test"]
+    expected = fragment_retrieval(client.all_documents("people"),
+                                  ["name", "aka"], "scop")
+    found = collection_fragment_retrieval(client, "people", ["name", "aka"],
+                                          "scop")
+    assert [d["_id"] for d in found] == [d["_id"] for d in expected] \
+        == ["scopatz"]
+    assert client.fragment_index("people") is client.fragment_index("people")
+    # edits through the client are seen by the next search
+    doc = client.find_one("test", "people", {"_id": "scopatz"})
+    doc["name"] = "Tony Skopatz"
+    client.mark_dirty("test", "people")
+    assert collection_fragment_retrieval(client, "people", ["name"],
+                                         "scop") == []
+    found = collection_fragment_retrieval(client, "people", ["name"],
+                                          "skop")
+    assert [d["_id"] for d in found] == ["scopatz"]
+    found[0]["name"] = "Changed"
+    assert doc["name"] == "Tony Skopatz"
+
+
+def test_get_person_identity_index(fs_db):
+    client = FileSystemClient(RunControl(builddir="_build"))
+    client.load_database(fs_db)
+    client.chained_db = client.dbs["test"]
+    rc = RunControl(client=client)
+    person = get_person("ANTHONY SCOPATZ", rc)
+    assert person["_id"] == "scopatz"
+    person["name"] = "Changed"
+    assert get_person("anthony scopatz", rc)["name"] == "Anthony Scopatz"
+    assert client.identity_index("people") is client.identity_index("people")
+    client.insert_one("test", "people", {"_id": "newguy", "name": "New Guy"})
+    assert get_person("new guy", rc)["_id"] == "newguy"
+
+
 @pytest.mark.parametrize(
     "input,expected",
     [
@@ -656,6 +769,43 @@ def test_get_id_from_name(input,expected):
 )
 def test_get_id_from_name(input,expected):
     assert(get_id_from_name(input[0],input[1]) == expected)
+    index = IdentityIndex(input[0], case_sensitive=False)
+    assert(get_id_from_name(index, input[1].upper()) == expected)
+
+
+def test_get_id_from_name_client(fs_db):
+    client = FileSystemClient(RunControl(builddir="_build"))
+    client.load_database(fs_db)
+    client.chained_db = client.dbs["test"]
+    index = client.identity_index("people")
+    assert get_id_from_name(index, "anthony scopatz") == "scopatz"
+    client.update_one("test", "people", {"_id": "scopatz"},
+                      {"aka": ["Tony S"]})
+    assert get_id_from_name(client.identity_index("people"), "tony s") \
+        == "scopatz"
+
+@pytest.mark.parametrize("bigger", ["left", "right"])
+def test_join_collections(bigger):
+    proposals = [{"_id": "p1", "title": "A"}, {"_id": "p2", "title": "B"},
+                 {"_id": "p3", "title": "C"}]
+    grants = [{"_id": "g1", "meta": {"proposal": "p2"}, "title": "B!"},
+              {"_id": "g2", "meta": {"proposal": "p2"}},
+              {"_id": "g3", "meta": {"proposal": "p9"}}]
+    if bigger == "left":
+        proposals = proposals + [{"_id": "p%d" % i} for i in range(4, 8)]
+    join = lambda how: list(join_collections(
+        proposals, iter(grants), right_on="meta.proposal", how=how))
+    inner = join("inner")
+    assert [(d["_id"], d["title"]) for d in inner] == [("g1", "B!"), ("g2", "B")]
+    assert inner[1].maps == [proposals[1], grants[1]]
+    left = join("left")
+    assert [d["_id"] for d in left][:4] == ["p1", "g1", "g2", "p3"]
+    assert len(left) == len(proposals) + 1
+    union = join("union")
+    assert [d["_id"] for d in union] == [d["_id"] for d in left] + ["g3"]
+    with pytest.raises(ValueError):
+        join("outer")
+
 
 @pytest.mark.parametrize(
     "input, expected",
@@ -706,6 +856,7 @@ people = [person1, person2, person3]
         ((people, ['name', 'Jerry']), []),
         ((people, ['position', 'Prof']), [person1, person2]),
         ((people, ['position', 'Prof', 'name', 'Chris']), [person2]),
+        ((people, ['aka', 'bc, a', 'name', 'doe']), [person3]),
     ],
 )
 def test_key_value_pair_filter(input, expected):
@@ -738,6 +889,63 @@ def test_search_collection(input, expected):
     assert(search_collection(input[0], input[1], input[2]) == expected)
 
 
+def test_path_values():
+    doc = {"_id": "a", "a.b": 1, "employment": [
+        {"organization": "Columbia", "aka": ["CU", "Columbia U"]},
+        {"organization": "BNL"}]}
+    assert path_values(doc, "a.b") == [1]
+    assert path_values(doc, "employment.organization") == ["Columbia", "BNL"]
+    assert path_values(doc, "employment.1.organization") == ["BNL"]
+    assert path_values(doc, "employment.2.organization") == []
+    assert path_values(doc, "employment.aka") == ["CU", "Columbia U"]
+    assert path_values(doc, "missing.path") == []
+
+
+def test_compile_path():
+    doc = {"_id": "a", "employment": [{"organization": "Columbia"}]}
+    get = compile_path("employment.0.organization")
+    assert get is compile_path("employment.0.organization")
+    assert get(doc) == "Columbia"
+    assert compile_path(("employment", 0))(doc) is doc["employment"][0]
+    assert compile_path("employment.1.organization")(doc, "") == ""
+    assert compile_path("_id.x")(doc) is None
+
+
+def test_document_by_value():
+    groups = [{"_id": "a", "name": "A", "pi": {"id": "x"}},
+              {"_id": "b", "pi": {"id": "y"}},
+              {"_id": "c", "name": ["C"], "pi": {"id": "y"}}]
+    assert document_by_value(iter(groups), "name", "A") is groups[0]
+    assert document_by_value(iter(groups), ("pi", "id"), "y") is groups[1]
+    assert document_by_value(iter(groups), "name", ["C"]) is groups[2]
+    assert document_by_value(groups, ("pi", "id"), "y") is groups[1]
+    assert document_by_value(groups, "name", ["C"]) is groups[2]
+    assert document_by_value(groups, "name", "Z") is None
+    groups[1]["pi"]["id"] = "z"
+    assert document_by_value(groups, ("pi", "id"), "y") is groups[2]
+    index = ValueIndex(groups, "pi.id")
+    assert index.get("x") is groups[0]
+    assert index.get(["x"]) is None
+
+
+def test_select():
+    docs = [
+        {"_id": "a", "position": "Professor", "begin_year": 2019,
+         "employment": [{"organization": "Columbia"}]},
+        {"_id": "b", "position": "professor", "begin_year": 2015,
+         "end_year": 2016, "employment": [{"organization": "BNL"}]},
+        {"_id": "c", "position": "student"},
+    ]
+    ids = lambda preds: [d["_id"] for d in select(iter(docs), preds)]
+    assert ids([substring("position", "PROF")]) == ["a", "b"]
+    assert ids([substring("position", "Prof", case_sensitive=True)]) == ["a"]
+    assert ids([equals("employment.organization", "BNL")]) == ["b"]
+    assert ids([substring("position", "prof"),
+                date_range(since=dt.date(2018, 1, 1))]) == ["a"]
+    assert ids([date_range(before=dt.date(2016, 6, 1))]) == ["b"]
+    assert ids([]) == ["a", "b", "c"]
+
+
 appointed_people = [
     {'name': 'Kurt Godel', '_id': 'kgodel',
      'appointments': {